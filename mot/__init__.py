@@ -0,0 +1 @@
+"""Simulation and support code for the Multiple Object Tracking task."""
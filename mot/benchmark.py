@@ -0,0 +1,222 @@
+"""Headless benchmarks of the task's hot paths: physics, placement, per-frame update overhead and scoring.
+
+Run with
+
+    python -m mot.benchmark [--quick] [--out benchmark_results.jsonl]
+    python -m mot.benchmark --compare OLD.jsonl NEW.jsonl
+
+Every case is appended to the output file as one JSON line holding the
+benchmark, its parameters, its metrics and a description of the run (commit,
+Python and NumPy versions, machine), so files from different versions can be
+compared case by case. Only the benchmarks in PRIMARY are checked for
+regressions; the others are recorded for information.
+"""
+import argparse
+import functools
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from mot.physics import Integrator
+from mot.placement import PlacementError
+from mot.render import NullRenderer
+from mot.trajectories import trial_rng
+from mot.trial import Trial
+
+COUNTS = (8, 32, 128, 512, 1024)
+SIZES = (10, 25, 50)
+DISPLAYS = ((1200, 900), (2400, 1800))
+
+# benchmark -> (metric compared across runs, whether higher is better)
+PRIMARY = {'physics': ('steps_per_s', True), 'placement': ('seconds', False), 'scoring': ('calls_per_s', True),
+           'memory': ('peak_kib', False)}
+
+
+def make_trial(num_objects, object_size, display_size, seed=0, batch_draw=False):
+    """Return a headless trial with the given load, not yet placed."""
+    return Trial(NullRenderer(), None, 'gray', 'black', num_objects, ['black']*num_objects, object_size,
+                 ['circle']*num_objects, 1, display_size=display_size, rng=trial_rng(seed, num_objects),
+                 batch_draw=batch_draw)
+
+
+def best_time(function, repeats=5, min_time=0.05):
+    """Return the shortest time per call of function, calling it for at least min_time in each of repeats."""
+    best = float('inf')
+    for _ in range(repeats):
+        calls, start = 0, time.perf_counter()
+        while True:
+            function()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = min(best, elapsed / calls)
+    return best
+
+
+def bench_physics(num_objects, object_size, display_size, seconds=0.5, physics_rate=240, repeats=3):
+    """Time the World stepping through the given simulated time; the fastest of repeats."""
+    elapsed = []
+    for seed in range(repeats):
+        trial = make_trial(num_objects, object_size, display_size, seed)
+        trial.place()
+        integrator = Integrator(trial.world, physics_rate)
+        start = time.perf_counter()
+        steps = integrator.advance(seconds)
+        elapsed.append(time.perf_counter() - start)
+    return dict(steps_per_s=steps / min(elapsed), disc_steps_per_s=steps*num_objects / min(elapsed))
+
+
+def bench_placement(num_objects, object_size, display_size, repeats=5):
+    """Time the initial placement of a trial's objects; the fastest of repeats."""
+    times = []
+    for seed in range(repeats):
+        trial = make_trial(num_objects, object_size, display_size, seed)
+        start = time.perf_counter()
+        trial.place()
+        times.append(time.perf_counter() - start)
+    return dict(seconds=min(times), mean_seconds=sum(times) / len(times))
+
+
+def bench_update_overhead(num_objects, object_size, display_size, batch_draw):
+    """Time the Python side of the per-frame stimulus update: handing the world's positions to the stimuli.
+
+    The stimuli are the NullRenderer's, so this leaves out PsychoPy's own update
+    and draw cost, and is not gated as a regression (see PRIMARY).
+    """
+    trial = make_trial(num_objects, object_size, display_size, batch_draw=batch_draw)
+    trial.setup()
+
+    def update():
+        if trial.discs is not None:
+            trial.discs.xys = trial.world.pos
+        else:
+            [object.update() for object in trial.objects]
+    return dict(frames_per_s=1 / best_time(update))
+
+
+def bench_scoring():
+    """Time scoring a response with Trial.score_response."""
+    trial = make_trial(8, 50, (1200, 900))
+    trial.place()
+    trial.to_stay = 0
+    targets = itertools.cycle(np.random.default_rng(0).uniform(-400, 400, (1000, 2)).tolist())
+    return dict(calls_per_s=1 / best_time(lambda: trial.score_response(*next(targets))))
+
+
+def bench_memory(num_objects, object_size, display_size, seconds=0.25):
+    """Return the peak memory allocated while setting up a trial and simulating it."""
+    tracemalloc.start()
+    try:
+        trial = make_trial(num_objects, object_size, display_size)
+        trial.setup()
+        Integrator(trial.world).advance(seconds)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return dict(peak_kib=peak / 1024)
+
+
+def run_info():
+    """Describe the code and machine the benchmarks run on."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return dict(commit=commit, time=time.strftime('%Y-%m-%dT%H:%M:%S'), python=platform.python_version(),
+                numpy=np.__version__, machine=platform.machine(), processor=platform.processor(),
+                system=platform.system())
+
+
+def cases(counts=COUNTS, sizes=SIZES, displays=DISPLAYS):
+    """Yield (benchmark, parameters, function) for every case of the sweep."""
+    for display_size in displays:
+        for object_size in sizes:
+            for num_objects in counts:
+                load = dict(num_objects=num_objects, object_size=object_size, display_size=list(display_size))
+                args = (num_objects, object_size, display_size)
+                yield 'physics', load, functools.partial(bench_physics, *args)
+                yield 'placement', load, functools.partial(bench_placement, *args)
+                for batch_draw in (False, True):
+                    yield ('update_overhead', dict(load, batch_draw=batch_draw),
+                           functools.partial(bench_update_overhead, *args, batch_draw))
+                yield 'memory', load, functools.partial(bench_memory, *args)
+    yield 'scoring', {}, bench_scoring
+
+
+def run(out, counts=COUNTS, sizes=SIZES, displays=DISPLAYS):
+    """Run the sweep, appending a JSON line per case to out and printing a line per case."""
+    info = run_info()
+    with open(out, 'a') as results:
+        for benchmark, params, function in cases(counts, sizes, displays):
+            try:
+                metrics, error = function(), None
+            except PlacementError as e: # too many objects of this size for the display
+                metrics, error = {}, str(e)
+            results.write(json.dumps(dict(benchmark=benchmark, params=params, metrics=metrics, error=error,
+                                          run=info), sort_keys=True) + '\n')
+            results.flush()
+            print(benchmark, json.dumps(params, sort_keys=True), 'skipped' if error else
+                  ' '.join('%s=%.4g' % item for item in sorted(metrics.items())))
+
+
+def load_results(filename):
+    """Return the latest metrics of every case in a results file, keyed by (benchmark, parameters)."""
+    latest = {}
+    with open(filename) as results:
+        for line in results:
+            record = json.loads(line)
+            if not record['error']:
+                latest[record['benchmark'], json.dumps(record['params'], sort_keys=True)] = record['metrics']
+    return latest
+
+
+def compare(old, new, tolerance=0.2):
+    """Print the change of every case's primary metric between two results files, and return the regressions.
+
+    Arguments:
+        old, new -- the results files to compare
+        tolerance -- the relative slowdown (0.2 is 20%) beyond which a case counts as a regression
+    """
+    before, after = load_results(old), load_results(new)
+    regressions = []
+    for key in sorted(before.keys() & after.keys()):
+        if key[0] not in PRIMARY:
+            continue
+        metric, higher_is_better = PRIMARY[key[0]]
+        ratio = after[key][metric] / before[key][metric]
+        speedup = ratio if higher_is_better else 1 / ratio
+        regressed = speedup < 1 - tolerance
+        if regressed:
+            regressions.append(key)
+        print('%-12s %-70s %s %.4g -> %.4g (x%.2f)%s' % (key[0], key[1], metric, before[key][metric],
+                                                           after[key][metric], speedup, '  REGRESSION' if regressed else ''))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', default='benchmark_results.jsonl', help='the results file to append to')
+    parser.add_argument('--quick', action='store_true', help='run a small subset of the sweep')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two results files instead')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative slowdown counted as a regression')
+    args = parser.parse_args(argv)
+    if args.compare:
+        return 1 if compare(*args.compare, tolerance=args.tolerance) else 0
+    if args.quick:
+        run(args.out, counts=(8, 128), sizes=(25,), displays=DISPLAYS[:1])
+    else:
+        run(args.out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
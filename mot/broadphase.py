@@ -0,0 +1,74 @@
+"""Broadphase spatial index for disc collisions."""
+import numpy as np
+
+# Half of the 3x3 cell neighbourhood; together with pairs inside a cell this
+# visits every pair of neighbouring cells exactly once.
+_NEIGHBOURS = ((1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+class UniformGrid:
+    """A uniform grid over one or more rectangular regions of the display.
+
+    Each disc belongs to one region (its hemifield); discs in different regions
+    are never paired, and every candidate pair inside a region is yielded once.
+    """
+    def __init__(self, regions, cell_size):
+        """Initialize the grid.
+
+        Arguments:
+            regions -- a list of display bounds, each given like Trial.bounds_left as
+                       the x coordinates of the left and right edges and the y
+                       coordinates of the top and bottom edges
+            cell_size -- the side of a grid cell; must be at least the largest sum of
+                         two disc radii so that touching discs share or neighbour a cell
+        """
+        self.cell_size = float(cell_size)
+        self.origin = np.array([(r[0][0], r[1][1]) for r in regions], dtype=float) # left, bottom
+        extent = np.array([(r[0][1] - r[0][0], r[1][0] - r[1][1]) for r in regions], dtype=float)
+        self.shape = np.maximum(np.ceil(extent / self.cell_size), 1).astype(np.int64) # nx, ny
+        self.offset = np.concatenate(([0], np.cumsum(self.shape[:, 0]*self.shape[:, 1])[:-1]))
+
+    def pairs(self, pos, group):
+        """Return two index arrays holding each candidate pair of discs once.
+
+        Arguments:
+            pos -- an (n, 2) array of disc positions
+            group -- an (n,) array giving the region of every disc
+        """
+        n = len(pos)
+        if n < 2:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        nx, ny = self.shape[group, 0], self.shape[group, 1]
+        cell = np.floor((pos - self.origin[group]) / self.cell_size).astype(np.int64)
+        cx = np.clip(cell[:, 0], 0, nx - 1)
+        cy = np.clip(cell[:, 1], 0, ny - 1)
+        key = self.offset[group] + cy*nx + cx
+
+        order = np.argsort(key, kind='stable')
+        keys = key[order]
+        cx, cy, nx, ny = cx[order], cy[order], nx[order], ny[order]
+
+        # Pairs inside the same cell: every later disc in the sorted run.
+        a, b = _expand(np.arange(1, n + 1), np.searchsorted(keys, keys, side='right'))
+        firsts, seconds = [a], [b]
+
+        for dx, dy in _NEIGHBOURS:
+            inside = (cx + dx >= 0) & (cx + dx < nx) & (cy + dy < ny)
+            target = keys + dy*nx + dx
+            start = np.searchsorted(keys, target, side='left')
+            stop = np.where(inside, np.searchsorted(keys, target, side='right'), start)
+            a, b = _expand(start, stop)
+            firsts.append(a)
+            seconds.append(b)
+
+        return order[np.concatenate(firsts)], order[np.concatenate(seconds)]
+
+
+def _expand(start, stop):
+    """Return (row, column) arrays for every column in [start[row], stop[row])."""
+    counts = np.maximum(stop - start, 0)
+    rows = np.repeat(np.arange(len(start)), counts)
+    first = np.cumsum(counts) - counts
+    cols = np.arange(counts.sum()) - np.repeat(first, counts) + np.repeat(start, counts)
+    return rows, cols
@@ -0,0 +1,188 @@
+"""Monte Carlo statistics of the stimuli, simulated headless across every CPU core.
+
+Run with
+
+    python -m mot.montecarlo --trials 10000 --objects 8 16 --sizes 25 50 --out stimulus_stats.csv
+    python -m mot.montecarlo --trials 4096 --scaling # throughput at 1, 2, ... and all cores
+
+Every trial of a parameter set is placed from its own seeded stream
+(trial_rng(seed, index)), so the results do not depend on how the trials
+are split between processes, and the same seed gives the same trials.
+Trials are simulated in chunks, each chunk in one World in one process; a
+chunk's memory grows with its trials, not with their square, as discs only
+pair up within their own trial and hemifield.
+"""
+import argparse
+import csv
+import itertools
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from mot.physics import Integrator
+from mot.trajectories import place_trials
+
+STATISTICS = ('collisions', 'bounces', 'target_collisions', 'target_bounces', 'crowding', 'nearest',
+              'time_to_wall', 'near_wall')
+
+
+def simulate_chunk(seed, start, stop, num_objects, object_size, trial_duration, display_size=(1200, 900),
+                   physics_rate=240, crowding_radius=None, wall_horizon=0.25, reference_rate=60):
+    """Simulate trials start to stop of a parameter set and return their statistics.
+
+    The queried target of each trial is drawn uniformly from its objects, from
+    the trial's stream once placement is done. Returns a dict of arrays, one
+    value per trial, keyed by STATISTICS:
+
+        collisions, bounces -- the disc collisions and wall bounces of the whole trial
+        target_collisions, target_bounces -- those the target took part in
+        crowding -- the number of other objects within crowding_radius of the target at the end
+        nearest -- the distance from the target to the nearest other object at the end
+        time_to_wall -- the time, in seconds, until the target would reach a wall on its final heading
+        near_wall -- whether time_to_wall is under wall_horizon
+
+    Arguments:
+        seed -- the seed of the parameter set
+        start, stop -- the range of trial indices to simulate
+        num_objects, object_size, trial_duration -- as for Trial
+        display_size -- the width and height of the display area, in pixels
+        physics_rate -- the fixed rate of the physics simulation, in steps per second
+        crowding_radius -- the radius, in pixels, crowding is counted in; by default four object radii
+        wall_horizon -- the time to wall, in seconds, under which the target's heading counts as near a wall
+        reference_rate -- the frame rate the velocities are expressed in
+    """
+    if crowding_radius is None:
+        crowding_radius = 4*object_size
+    world, trials = place_trials(seed, range(start, stop), num_objects, object_size, trial_duration, display_size,
+                                 physics_rate)
+    Integrator(world, physics_rate, reference_rate).advance(trial_duration)
+
+    n = stop - start
+    shape = (n, num_objects)
+    targets = np.array([trial.rng.randrange(num_objects) for trial in trials])
+    rows = np.arange(n)
+    collisions, bounces = world.collisions.reshape(shape), world.bounces.reshape(shape)
+    pos, vel = world.pos.reshape(shape + (2,)), world.vel.reshape(shape + (2,))
+    bounds = world.bounds.reshape(shape + (4,))
+
+    offset = pos - pos[rows, targets][:, None]
+    distance = np.sqrt(np.einsum('tij,tij->ti', offset, offset))
+    distance[rows, targets] = np.inf
+
+    p, v, b = pos[rows, targets], vel[rows, targets], bounds[rows, targets]
+    lo, hi = np.column_stack((b[:, 0], b[:, 3])), np.column_stack((b[:, 1], b[:, 2]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frames = np.where(v > 0, (hi - p) / v, np.where(v < 0, (lo - p) / v, np.inf))
+    time_to_wall = frames.min(axis=1) / reference_rate
+
+    return dict(collisions=collisions.sum(axis=1) // 2, bounces=bounces.sum(axis=1),
+                target_collisions=collisions[rows, targets], target_bounces=bounces[rows, targets],
+                crowding=(distance <= crowding_radius).sum(axis=1), nearest=distance.min(axis=1),
+                time_to_wall=time_to_wall, near_wall=time_to_wall < wall_horizon)
+
+
+def simulate(num_trials, num_objects, object_size, trial_duration, display_size=(1200, 900), seed=0,
+             physics_rate=240, chunk=256, workers=None, **options):
+    """Simulate num_trials trials of one parameter set in parallel and return their statistics.
+
+    Arguments are as for simulate_chunk, plus:
+        num_trials -- the number of trials to simulate
+        chunk -- the number of trials simulated together in one process at a time
+        workers -- the number of processes; by default one per CPU core, and 1 runs in this process
+    """
+    starts = range(0, num_trials, chunk)
+    jobs = [(seed, start, min(start + chunk, num_trials), num_objects, object_size, trial_duration, display_size,
+             physics_rate) for start in starts]
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        results = [simulate_chunk(*job, **options) for job in jobs]
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(simulate_chunk, *job, **options) for job in jobs]
+            results = [future.result() for future in futures]
+    return {name: np.concatenate([result[name] for result in results]) for name in STATISTICS}
+
+
+def scaling(num_trials, num_objects, object_size, trial_duration, worker_counts=None, **options):
+    """Time one parameter set with each number of workers and return a row per count.
+
+    Each row holds the workers, the trials per second, the speedup over one worker
+    and the peak resident memory of the largest worker process so far, in MiB
+    (the process itself when workers is 1).
+
+    Arguments are as for simulate, plus:
+        worker_counts -- the numbers of processes to try; by default 1, 2, 4, ... and every core
+    """
+    if worker_counts is None:
+        cores = os.cpu_count()
+        worker_counts = sorted({1, cores} | {2**k for k in range(1, cores.bit_length()) if 2**k < cores})
+    rows = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        simulate(num_trials, num_objects, object_size, trial_duration, workers=workers, **options)
+        rate = num_trials / (time.perf_counter() - start)
+        who = resource.RUSAGE_SELF if workers == 1 else resource.RUSAGE_CHILDREN
+        rows.append(dict(workers=workers, trials_per_s=rate, speedup=rate / rows[0]['trials_per_s'] if rows else 1.0,
+                         peak_mib=resource.getrusage(who).ru_maxrss / 1024))
+    return rows
+
+
+def summarize(statistics):
+    """Return a summary row per statistic: its mean, standard deviation and 5th, 50th and 95th percentiles."""
+    rows = []
+    for name in STATISTICS:
+        values = np.asarray(statistics[name], dtype=float)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            rows.append(dict(statistic=name, n=0, mean=None, sd=None, p5=None, median=None, p95=None))
+            continue
+        p5, median, p95 = np.percentile(values, [5, 50, 95])
+        rows.append(dict(statistic=name, n=len(values), mean=values.mean(), sd=values.std(), p5=p5,
+                         median=median, p95=p95))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--trials', type=int, default=10000, help='trials per parameter set')
+    parser.add_argument('--objects', type=int, nargs='+', default=[8], help='object counts to sweep')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[50], help='object radii to sweep, in pixels')
+    parser.add_argument('--durations', type=float, nargs='+', default=[7], help='trial durations to sweep, in seconds')
+    parser.add_argument('--display', type=int, nargs=2, default=[1200, 900], help='display width and height')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='processes to use; all cores by default')
+    parser.add_argument('--out', default='stimulus_stats.csv', help='the summary table to write')
+    parser.add_argument('--scaling', action='store_true',
+                        help='time the first parameter set at 1, 2, ... and all cores instead')
+    args = parser.parse_args(argv)
+
+    if args.scaling:
+        print('%d cores' % os.cpu_count())
+        for row in scaling(args.trials, args.objects[0], args.sizes[0], args.durations[0], seed=args.seed,
+                           display_size=tuple(args.display)):
+            print('%(workers)3d workers: %(trials_per_s)8.0f trials/s  x%(speedup).2f  peak %(peak_mib).0f MiB' % row)
+        return 0
+
+    fieldnames = ['num_objects', 'object_size', 'trial_duration', 'statistic', 'n', 'mean', 'sd', 'p5', 'median', 'p95']
+    with open(args.out, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for num_objects, object_size, trial_duration in itertools.product(args.objects, args.sizes, args.durations):
+            start = time.perf_counter()
+            statistics = simulate(args.trials, num_objects, object_size, trial_duration, tuple(args.display),
+                                  args.seed, workers=args.workers)
+            elapsed = time.perf_counter() - start
+            print('%d objects, radius %g, %g s: %d trials in %.1f s (%.0f trials/s)'
+                  % (num_objects, object_size, trial_duration, args.trials, elapsed, args.trials / elapsed))
+            for row in summarize(statistics):
+                writer.writerow(dict(row, num_objects=num_objects, object_size=object_size,
+                                     trial_duration=trial_duration))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""Simulated observers for power analysis, run headless across every CPU core.
+
+Run with
+
+    python -m mot.observer --participants 2000 --design 10 20 40 --trials 80 160 --out power.csv
+
+A virtual participant is given a session exactly as the task builds one: the
+trial plan shuffled from the session seed, the pre-generated trajectories of
+that seed (see mot.trajectories) and the queried object drawn from each
+trial's stream. Sessions are drawn from a bank of session seeds, so their
+trajectories are simulated once and then read from the cache. The observer
+reports a direction for the queried object's final heading with an error
+that depends on the priority of its side (see Observer), and each response
+is scored by Trial.score_response, i.e. by find_angle and its 20 degree
+threshold.
+
+Power is then estimated by resampling experiments of a given number of
+participants and trials from the simulated population, and testing the
+difference in accuracy between high and low priority trials with a
+sign-flip permutation test.
+"""
+import argparse
+import csv
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from mot.plan import load_plan
+from mot.render import NullRenderer
+from mot.trajectories import load_session, trial_rng
+from mot.trial import Trial, queried_side
+
+
+class Observer:
+    """A response model: the reported direction is the true heading plus an angular error.
+
+    The error is normal, with a standard deviation of noise*(50/priority)**attention
+    degrees, where priority is that of the queried object's side; attention 0
+    means priorities are ignored. Each participant's noise is the model's
+    noise scaled by a log-normal factor with a spread of noise_between. With
+    probability lapse the response is a guess in a uniformly random direction.
+    """
+    def __init__(self, noise=25.0, attention=0.5, lapse=0.05, noise_between=0.2):
+        """Initialize the model.
+
+        Arguments:
+            noise -- the typical error at 50% priority, in degrees
+            attention -- how strongly the error shrinks with priority
+            lapse -- the probability of a random guess
+            noise_between -- the standard deviation of the log of the participants' noise
+        """
+        self.noise = noise
+        self.attention = attention
+        self.lapse = lapse
+        self.noise_between = noise_between
+
+    def participant_noise(self, rng):
+        """Draw one participant's noise, in degrees."""
+        return self.noise*math.exp(rng.normal(0, self.noise_between))
+
+    def respond(self, rng, headings, priorities, noise):
+        """Return the reported directions, in radians, for the true headings in radians.
+
+        Arguments:
+            rng -- the participant's numpy Generator
+            headings -- the final headings of the queried objects
+            priorities -- the priority, in percent, of each queried object's side
+            noise -- the participant's noise, in degrees
+        """
+        sd = noise*(50 / np.maximum(priorities, 1))**self.attention
+        error = np.radians(rng.normal(0, sd))
+        guess = rng.random(len(headings)) < self.lapse
+        error[guess] = rng.uniform(-np.pi, np.pi, guess.sum())
+        return headings + error
+
+
+def session_seed(seed, index):
+    """Return the session seed of entry index of the bank drawn from seed."""
+    return int(np.random.SeedSequence(seed, spawn_key=(0, index)).generate_state(1)[0] & 0x7fffffff)
+
+
+def simulate_participants(seed, start, stop, plan, observer, bank, num_objects, object_size, trial_duration,
+                          physics_rate=240, reach=100):
+    """Simulate participants start to stop and return their (participants, trials) priorities, errors and scores.
+
+    Arguments:
+        seed -- the seed of the simulation
+        start, stop -- the range of participant indices to simulate
+        plan -- the TrialPlan of a session, before shuffling
+        observer -- the Observer model
+        bank -- the number of session seeds participants are given in turn
+        num_objects, object_size, trial_duration, physics_rate -- as for Trial
+        reach -- the distance, in pixels, from the object to the point the response ends at
+    """
+    n, count = stop - start, len(plan)
+    priorities = np.zeros((n, count))
+    errors = np.zeros((n, count))
+    scores = np.zeros((n, count), dtype=np.int8)
+    sessions = {}
+    scorer = None
+    for row, participant in enumerate(range(start, stop)):
+        b = participant % bank
+        if b not in sessions: # what the participants given this session see, the same for each of them
+            s = session_seed(seed, b)
+            trajectories = load_session(s, count, num_objects, object_size, trial_duration, physics_rate=physics_rate)
+            targets = np.zeros(count, dtype=np.int64)
+            session_priorities = np.zeros(count)
+            for k, current in enumerate(plan.shuffled(s)):
+                side = queried_side(current['Left'], current['Questioned'])
+                lo, hi = (0, num_objects//2) if side == 0 else (num_objects//2, num_objects)
+                targets[k] = trial_rng(s, k).randrange(lo, hi) # the first draw of the trial's stream, as in remove_smart
+                session_priorities[k] = current['Right'] if side else current['Left']
+            final = np.array(trajectories[:, -1]) # the last frame of every trial
+            sessions[b] = final, targets, session_priorities
+            if scorer is None:
+                scorer = Trial(NullRenderer(), None, None, None, num_objects, [None]*num_objects, object_size,
+                               ['circle']*num_objects, trial_duration, physics_rate, trajectory=trajectories[0])
+                scorer.prepare()
+        final, targets, priorities[row] = sessions[b]
+        state = final[np.arange(count), targets]
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(1, participant)))
+        directions = observer.respond(rng, np.arctan2(state[:, 3], state[:, 2]), priorities[row],
+                                      observer.participant_noise(rng))
+
+        for k in range(count):
+            scorer.world.pos[:] = final[k, :, :2]
+            scorer.world.vel[:] = final[k, :, 2:]
+            scorer.to_stay = targets[k]
+            x, y = state[k, :2]
+            scorer.score_response(x + reach*math.cos(directions[k]), y + reach*math.sin(directions[k]))
+            errors[row, k], scores[row, k] = scorer.error, scorer.score
+    return priorities, errors, scores
+
+
+def simulate(num_participants, plan, observer, seed=0, bank=32, num_objects=8, object_size=50, trial_duration=7,
+             physics_rate=240, chunk=50, workers=None):
+    """Simulate num_participants participants in parallel, as for simulate_participants.
+
+    The bank's trajectories are generated first, here, so the workers only read them.
+
+    Arguments are as for simulate_participants, plus:
+        num_participants -- the number of participants to simulate
+        chunk -- the number of participants simulated in one process at a time
+        workers -- the number of processes; by default one per CPU core, and 1 runs in this process
+    """
+    for b in range(min(bank, num_participants)):
+        load_session(session_seed(seed, b), len(plan), num_objects, object_size, trial_duration,
+                     physics_rate=physics_rate)
+    jobs = [(seed, start, min(start + chunk, num_participants), plan, observer, bank, num_objects, object_size,
+             trial_duration, physics_rate) for start in range(0, num_participants, chunk)]
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        results = [simulate_participants(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(simulate_participants, *job) for job in jobs]
+            results = [future.result() for future in futures]
+    return tuple(np.concatenate(arrays) for arrays in zip(*results))
+
+
+def power(priorities, scores, participants, trials=None, experiments=1000, alpha=0.05, flips=2000, seed=0):
+    """Estimate the power to detect the difference in accuracy between high and low priority trials.
+
+    Each experiment draws participants from the simulated population (with
+    replacement) and trials from each of their sessions (without), and tests the
+    participants' high minus low priority accuracy against zero with a two-sided
+    sign-flip test. Returns the power and the mean effect, in proportion correct.
+
+    Arguments:
+        priorities, scores -- the (participants, trials) arrays from simulate
+        participants -- the number of participants per experiment
+        trials -- the number of trials per participant; by default the whole session
+        experiments -- the number of experiments drawn
+        alpha -- the significance level
+        flips -- the number of sign flips in the permutation test
+        seed -- the seed of the resampling
+    """
+    rng = np.random.default_rng(seed)
+    population, count = scores.shape
+    trials = trials or count
+    who = rng.integers(population, size=(experiments, participants))
+    which = np.argsort(rng.random((experiments, participants, count), dtype=np.float32), axis=2)[:, :, :trials]
+    p, s = priorities[who[:, :, None], which], scores[who[:, :, None], which]
+    high, low = p > 50, p < 50
+    with np.errstate(invalid='ignore'):
+        effect = (s*high).sum(axis=2) / high.sum(axis=2) - (s*low).sum(axis=2) / low.sum(axis=2)
+    effect = np.nan_to_num(effect) # a participant without trials of a kind counts as no effect
+
+    observed = np.abs(effect.mean(axis=1))
+    signs = rng.choice([-1.0, 1.0], size=(flips, participants))
+    null = np.abs(effect @ signs.T) / participants
+    pvalues = ((null >= observed[:, None] - 1e-12).sum(axis=1) + 1) / (flips + 1)
+    return float((pvalues < alpha).mean()), float(effect.mean())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--participants', type=int, default=2000, help='participants to simulate')
+    parser.add_argument('--design', type=int, nargs='+', default=[10, 20, 30, 40], help='participants per experiment')
+    parser.add_argument('--trials', type=int, nargs='+', default=[None], help='trials per participant; all by default')
+    parser.add_argument('--noise', type=float, default=25.0, help='response error at 50%% priority, in degrees')
+    parser.add_argument('--attention', type=float, default=0.5, help='how strongly the error shrinks with priority')
+    parser.add_argument('--lapse', type=float, default=0.05, help='probability of a random guess')
+    parser.add_argument('--noise-between', type=float, default=0.2, help='spread of the participants\' noise')
+    parser.add_argument('--plan', default='Set_Up_Trial.xlsx', help='the trial plan spreadsheet')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='processes to use; all cores by default')
+    parser.add_argument('--out', default='power.csv', help='the power table to write')
+    args = parser.parse_args(argv)
+
+    plan = load_plan(args.plan)
+    observer = Observer(args.noise, args.attention, args.lapse, args.noise_between)
+    start = time.perf_counter()
+    priorities, errors, scores = simulate(args.participants, plan, observer, args.seed, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    print('%d participants in %.1f s (%.0f per minute)' % (args.participants, elapsed, 60*args.participants / elapsed))
+    for priority in np.unique(priorities):
+        print('priority %g: %.3f correct, median error %.1f degrees'
+              % (priority, scores[priorities == priority].mean(), np.median(errors[priorities == priority])))
+
+    with open(args.out, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['participants', 'trials', 'power', 'effect'])
+        for participants in args.design:
+            for trials in args.trials:
+                estimate, effect = power(priorities, scores, participants, trials, seed=args.seed)
+                writer.writerow([participants, trials or len(plan), estimate, effect])
+                print('%d participants x %d trials: power %.3f (effect %.3f)'
+                      % (participants, trials or len(plan), estimate, effect))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""Batched disc physics for the Multiple Object Tracking task."""
+import numpy as np
+
+
+class World:
+    """Structure-of-arrays state for every disc in a trial.
+
+    Positions, velocities, radii and wall bounds are held in NumPy buffers so
+    that a whole scene is advanced by one call to step() instead of a Python
+    loop over the discs. After each step, contacts holds the index pairs of the
+    discs that collided in it, and walls the disc and axis (0 for x, 1 for y) of
+    each wall bounce.
+    """
+    def __init__(self, capacity=8, broadphase=None, broadphase_min=64):
+        """Initialize an empty world.
+
+        Arguments:
+            capacity -- the number of discs to preallocate room for
+            broadphase -- an optional spatial index (e.g. a UniformGrid) used to find
+                          candidate collision pairs; without one every pair in a
+                          group is tested
+            broadphase_min -- the number of discs below which every pair in a group is
+                              tested anyway, as that is cheaper than indexing few discs
+        """
+        self.broadphase = broadphase
+        self.broadphase_min = broadphase_min
+        self.count = 0
+        self._pos = np.zeros((capacity, 2))
+        self._vel = np.zeros((capacity, 2))
+        self._radius = np.zeros(capacity)
+        self._lo = np.zeros((capacity, 2)) # left, bottom
+        self._hi = np.zeros((capacity, 2)) # right, top
+        self._bounces = np.zeros(capacity, dtype=np.int64)
+        self._collisions = np.zeros(capacity, dtype=np.int64)
+        self._group = np.zeros(capacity, dtype=np.int64)
+        self._pairs = None
+        self.contacts = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        self.walls = self._no_walls = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    def _grow(self):
+        capacity = max(1, 2*len(self._radius))
+        for name in ('_pos', '_vel', '_radius', '_lo', '_hi', '_bounces', '_collisions', '_group'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, pos, velocity, radius, bounds, group=0):
+        """Add a disc to the world and return its index.
+
+        Arguments:
+            pos -- the starting (x, y) position of the disc
+            velocity -- the starting (x, y) velocity of the disc, in pixels per step
+            radius -- the collision radius of the disc
+            bounds -- the (left, right) and (top, bottom) limits of the disc's centre
+            group -- the region (hemifield) of the disc; discs only collide within a group
+        """
+        if self.count == len(self._radius):
+            self._grow()
+        i = self.count
+        self._pos[i] = pos
+        self._vel[i] = velocity
+        self._radius[i] = radius
+        self._lo[i] = (bounds[0][0], bounds[1][1])
+        self._hi[i] = (bounds[0][1], bounds[1][0])
+        self._bounces[i] = 0
+        self._collisions[i] = 0
+        self._group[i] = group
+        self.count += 1
+        self._pairs = None
+        return i
+
+    @property
+    def pos(self):
+        return self._pos[:self.count]
+
+    @property
+    def vel(self):
+        return self._vel[:self.count]
+
+    @property
+    def radius(self):
+        return self._radius[:self.count]
+
+    @property
+    def bounds(self):
+        """The left, right, top and bottom limits of every disc's centre."""
+        lo, hi = self._lo[:self.count], self._hi[:self.count]
+        return np.column_stack((lo[:, 0], hi[:, 0], hi[:, 1], lo[:, 1]))
+
+    @property
+    def bounces(self):
+        return self._bounces[:self.count]
+
+    @property
+    def collisions(self):
+        """The number of collisions with other discs of every disc."""
+        return self._collisions[:self.count]
+
+    @property
+    def group(self):
+        return self._group[:self.count]
+
+    def collide_bounds(self):
+        """Clamp discs that left their bounds and reflect their velocity."""
+        pos, lo, hi = self.pos, self._lo[:self.count], self._hi[:self.count]
+        hit = (pos < lo) | (pos > hi)
+        self.walls = self._no_walls
+        if hit.any():
+            np.clip(pos, lo, hi, out=pos)
+            vel, bounces = self.vel, self.bounces
+            vel[hit] *= -1
+            bounces += hit.sum(axis=1)
+            self.walls = np.nonzero(hit)
+
+    def candidate_pairs(self):
+        """Return two index arrays holding each pair of discs that may be touching once."""
+        if self.broadphase is not None and self.count >= self.broadphase_min:
+            return self.broadphase.pairs(self.pos, self.group)
+        if self._pairs is None:
+            # The pairs within each group only, so a world of many small groups (e.g. a
+            # whole session of trials) needs memory for its own pairs, not for every pair
+            order = np.argsort(self.group, kind='stable')
+            _, starts, sizes = np.unique(self.group[order], return_index=True, return_counts=True)
+            parts_i, parts_j = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+            for size in np.unique(sizes): # groups of equal size share one triangle of offsets
+                a, b = np.triu_indices(size, 1)
+                first = starts[sizes == size][:, None]
+                parts_i.append(order[(first + a).ravel()])
+                parts_j.append(order[(first + b).ravel()])
+            i, j = np.concatenate(parts_i), np.concatenate(parts_j)
+            pairs = np.lexsort((j, i)) # in the order of the full triangle, so ties resolve as before
+            self._pairs = i[pairs], j[pairs]
+        return self._pairs
+
+    def sweep_discs(self, dt):
+        """Move every disc through one step of length dt, resolving disc collisions.
+
+        Collisions are found with a swept-circle test, so discs that would pass
+        through each other within the step are caught at their time of impact.
+        A disc takes part in at most one collision per step (its earliest); pairs
+        left over are picked up on the next step. Only approaching pairs collide,
+        so overlapping discs are never bounced back and forth.
+
+        Arguments:
+            dt -- the step length, in reference frames (see Integrator)
+        """
+        pos, vel, radius = self.pos, self.vel, self.radius
+        i, j = self.candidate_pairs()
+        self.contacts = (i[:0], j[:0])
+        toi = None
+        if len(i):
+            d = pos[i] - pos[j]
+            w = (vel[i] - vel[j]) * dt
+            reach = radius[i] + radius[j]
+            a = np.einsum('ij,ij->i', w, w)
+            b = 2*np.einsum('ij,ij->i', d, w)
+            c = np.einsum('ij,ij->i', d, d) - reach*reach
+            disc = b*b - 4*a*c
+            approaching = b < 0
+            toi = np.zeros(len(i))
+            ahead = approaching & (c > 0) & (disc >= 0)
+            toi[ahead] = (-b[ahead] - np.sqrt(disc[ahead])) / (2*a[ahead])
+            hit = approaching & ((c <= 0) | (ahead & (toi <= 1)))
+            i, j, toi = i[hit], j[hit], toi[hit]
+            if not len(toi):
+                toi = None
+
+        if toi is None:
+            pos += vel * dt
+            return
+
+        # Keep each disc's earliest collision only; ranks make ties impossible.
+        rank = np.empty(len(toi), dtype=np.int64)
+        rank[np.argsort(toi, kind='stable')] = np.arange(len(toi))
+        first = np.full(self.count, len(toi), dtype=np.int64)
+        np.minimum.at(first, i, rank)
+        np.minimum.at(first, j, rank)
+        keep = (first[i] == rank) & (first[j] == rank)
+        i, j, toi = i[keep], j[keep], toi[keep]
+        self.contacts = (i, j)
+        collisions = self.collisions
+        collisions[i] += 1 # a disc is in at most one pair of a step
+        collisions[j] += 1
+
+        # Free motion up to the time of impact, equal-mass elastic exchange along
+        # the line of centres, then the rest of the step with the new velocities.
+        before = np.ones(self.count)
+        before[i] = toi
+        before[j] = toi
+        pos += vel * (dt*before)[:, None]
+        d = pos[i] - pos[j]
+        dist2 = np.maximum(np.einsum('ij,ij->i', d, d), 1e-12)
+        impulse = (np.einsum('ij,ij->i', vel[i] - vel[j], d) / dist2)[:, None] * d
+        vel[i] -= impulse
+        vel[j] += impulse
+        pos[i] += vel[i] * (dt*(1 - toi))[:, None]
+        pos[j] += vel[j] * (dt*(1 - toi))[:, None]
+
+    def step(self, dt=1.0):
+        """Advance every disc by one step: motion and disc collisions, then wall bounces.
+
+        Arguments:
+            dt -- the step length, in reference frames (see Integrator)
+        """
+        self.sweep_discs(dt)
+        self.collide_bounds()
+
+
+class Integrator:
+    """Advances a World at a fixed physics rate, independent of the display rate.
+
+    Velocities are in pixels per reference frame (1/60 s by default), the unit
+    the task's speeds were designed in. Each call to advance() runs as many fixed
+    substeps as are needed for the simulation to catch up with the elapsed time,
+    so disc speed does not depend on the monitor refresh rate or dropped frames.
+
+    After a long stall (a garbage collection pause, a window event) catching up
+    in one frame would run hundreds of substeps and could drop the next frames
+    too. With max_steps set, a call runs at most that many substeps and the rest
+    of the backlog is dropped: the discs lose that stretch of motion, which is
+    the price of the display staying smooth. Without it (the default, as for
+    batch generation) every due substep is run.
+    """
+    def __init__(self, world, rate=240, reference_rate=60, recorder=None, max_steps=None):
+        """Initialize the integrator.
+
+        Arguments:
+            world -- the World to advance
+            rate -- the physics rate, in steps per second
+            reference_rate -- the frame rate the velocities are expressed in
+            recorder -- an optional TrajectoryRecorder (see mot.recorder) logging the
+                        collisions and wall bounces of every substep
+            max_steps -- the most substeps one call to advance() runs, or None for no limit
+        """
+        self.world = world
+        self.rate = rate
+        self.dt = reference_rate / rate
+        self.recorder = recorder
+        self.max_steps = max_steps
+        self.steps = 0
+        self.dropped = 0 # substeps skipped by the max_steps limit
+
+    @property
+    def time(self):
+        """The time the simulation has reached, in seconds since its start, including dropped substeps."""
+        return (self.steps + self.dropped) / self.rate
+
+    def advance(self, elapsed):
+        """Step the world up to the elapsed time and return the number of substeps run.
+
+        Arguments:
+            elapsed -- the time since the start of the simulation, in seconds
+        """
+        due = max(int(elapsed*self.rate) - self.steps - self.dropped, 0)
+        if self.max_steps is not None and due > self.max_steps:
+            self.dropped += due - self.max_steps
+            due = self.max_steps
+        for _ in range(due):
+            self.world.step(self.dt)
+            self.steps += 1
+            if self.recorder is not None:
+                self.recorder.log_step(self.time, self.world)
+        return due
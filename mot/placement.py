@@ -0,0 +1,113 @@
+"""Bounded-time placement of non-overlapping discs."""
+import math
+import random
+
+import numpy as np
+
+
+class PlacementError(ValueError):
+    """Raised when discs cannot be placed in a region at the requested separation."""
+
+
+def max_discs(region, min_distance):
+    """Return an upper bound on the number of points in region that are all more than min_distance apart.
+
+    This is Groemer's packing bound for a convex region, 2A/(sqrt(3) d^2) + P/(2d) + 1,
+    with A and P the area and perimeter of the rectangle the points may lie in.
+
+    Arguments:
+        region -- the (x_min, x_max) and (y_min, y_max) limits of the points
+        min_distance -- the separation the points must exceed
+    """
+    width = max(region[0][1] - region[0][0], 0)
+    height = max(region[1][1] - region[1][0], 0)
+    return int(2*width*height / (math.sqrt(3)*min_distance**2) + (width + height) / min_distance + 1)
+
+
+class _Grid:
+    """Points more than d apart, bucketed in cells of side d/sqrt(2) so a cell holds at most one."""
+    def __init__(self, region, d):
+        self.region = region
+        self.d2 = d*d
+        self.cell = d / math.sqrt(2)
+        self.shape = (int((region[0][1] - region[0][0]) / self.cell) + 1,
+                      int((region[1][1] - region[1][0]) / self.cell) + 1)
+        self.cells = np.full(self.shape, -1, dtype=np.int64)
+        self.points = []
+
+    def _cell(self, x, y):
+        return int((x - self.region[0][0]) / self.cell), int((y - self.region[1][0]) / self.cell)
+
+    def fits(self, x, y):
+        """Whether (x, y) is inside the region and more than d from every point."""
+        if not (self.region[0][0] <= x <= self.region[0][1] and self.region[1][0] <= y <= self.region[1][1]):
+            return False
+        cx, cy = self._cell(x, y)
+        near = self.cells[max(cx - 2, 0):cx + 3, max(cy - 2, 0):cy + 3]
+        for k in near[near >= 0]:
+            px, py = self.points[k]
+            if (px - x)**2 + (py - y)**2 <= self.d2:
+                return False
+        return True
+
+    def add(self, x, y):
+        self.cells[self._cell(x, y)] = len(self.points)
+        self.points.append((x, y))
+
+
+def place_discs(n, region, min_distance, rng=None, attempts=30):
+    """Return n random positions in region, every two of them more than min_distance apart.
+
+    Positions are first drawn uniformly, as many times as attempts per disc,
+    keeping each one that is clear of the discs already placed. If that does
+    not place every disc (a crowded region), the rest are taken at random from
+    a Poisson-disk fill of the remaining free space (Bridson's algorithm), which
+    packs far closer than uniform draws do. A grid makes each test constant
+    time, so the run time is bounded by the number of discs and cells.
+
+    Arguments:
+        n -- the number of discs to place
+        region -- the (x_min, x_max) and (y_min, y_max) limits of the disc centres
+        min_distance -- the separation every pair of centres must exceed
+        rng -- the random number generator (e.g. a seeded random.Random); defaults to the random module
+        attempts -- the number of uniform draws per disc before falling back to the fill
+
+    Raises PlacementError if n discs cannot fit in the region at this separation, or
+    were not placed within the bounded number of tries.
+    """
+    rng = rng if rng is not None else random
+    (x0, x1), (y0, y1) = region
+    if n > 0 and (x1 < x0 or y1 < y0 or n > max_discs(region, min_distance)):
+        raise PlacementError('%d discs cannot be placed more than %g apart in x %g..%g, y %g..%g'
+                             % (n, min_distance, x0, x1, y0, y1))
+    grid = _Grid(region, min_distance)
+    for _ in range(attempts*n):
+        if len(grid.points) == n:
+            return grid.points
+        x, y = rng.uniform(x0, x1), rng.uniform(y0, y1)
+        if grid.fits(x, y):
+            grid.add(x, y)
+    if len(grid.points) == n:
+        return grid.points
+
+    placed = len(grid.points)
+    if not placed:
+        grid.add(rng.uniform(x0, x1), rng.uniform(y0, y1))
+    active = list(range(len(grid.points)))
+    while active:
+        k = rng.randrange(len(active))
+        px, py = grid.points[active[k]]
+        for _ in range(attempts):
+            angle, distance = rng.uniform(0, 2*math.pi), min_distance*(1 + rng.random())
+            x, y = px + distance*math.cos(angle), py + distance*math.sin(angle)
+            if grid.fits(x, y):
+                grid.add(x, y)
+                active.append(len(grid.points) - 1)
+                break
+        else:
+            active[k] = active[-1]
+            active.pop()
+    if len(grid.points) < n:
+        raise PlacementError('only %d of %d discs could be placed more than %g apart in x %g..%g, y %g..%g'
+                             % (len(grid.points), n, min_distance, x0, x1, y0, y1))
+    return grid.points[:placed] + rng.sample(grid.points[placed:], n - placed)
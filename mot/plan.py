@@ -0,0 +1,120 @@
+"""The trial plan: the rows of the set-up spreadsheet and the blocks they fall in.
+
+Reading Set_Up_Trial.xlsx needs pandas and openpyxl, which take longer to
+import and run than the rest of the start-up together. load_plan() compiles
+the spreadsheet once into a small .npz file next to it and reads that on
+later launches; the compiled plan is rebuilt whenever the spreadsheet (or
+the block structure) changes, as its hash is stored with it.
+"""
+import hashlib
+import os
+
+import numpy as np
+
+PLAN_VERSION = 1 # bump when the compiled format changes, so stale plans are not reused
+COLUMNS = ('Number', 'Type', 'Left', 'Right', 'Questioned')
+BLOCKS = (0, 10, 40, 70, 100, 130) # the first trial of each block; the last block runs to the end
+
+
+class TrialPlan:
+    """The trials of a session in order, one row of COLUMNS each, split into blocks.
+
+    Indexing with an int returns the trial as a dict keyed by column name;
+    indexing with a slice returns a plan of those trials.
+    """
+    def __init__(self, trials, block_starts=BLOCKS, columns=COLUMNS):
+        """Initialize the plan.
+
+        Arguments:
+            trials -- a (trials, columns) array, one row per trial
+            block_starts -- the index of the first trial of each block
+            columns -- the name of each column of trials
+        """
+        self.trials = np.asarray(trials)
+        self.block_starts = tuple(int(start) for start in block_starts if start < len(self.trials))
+        self.columns = tuple(columns)
+
+    def __len__(self):
+        return len(self.trials)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(len(self))
+            starts = [0] + [s - start for s in self.block_starts if start < s < stop]
+            return TrialPlan(self.trials[start:stop], starts, self.columns)
+        return dict(zip(self.columns, self.trials[index].tolist()))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def column(self, name):
+        """Return one column of the plan as an array."""
+        return self.trials[:, self.columns.index(name)]
+
+    def blocks(self):
+        """Return the (start, stop) trial indices of each block."""
+        return list(zip(self.block_starts, self.block_starts[1:] + (len(self),)))
+
+    def block_of(self, index):
+        """Return the number of the block holding the trial index."""
+        return int(np.searchsorted(self.block_starts, index, side='right')) - 1
+
+    def is_break(self, index):
+        """Whether the trial index starts a block after the first, so a break comes before it."""
+        return index in self.block_starts[1:]
+
+    def shuffled(self, seed):
+        """Return a copy of the plan with the trials shuffled within each block, reproducibly from seed."""
+        trials = self.trials.copy()
+        shuffler = np.random.default_rng(seed)
+        for start, stop in self.blocks():
+            shuffler.shuffle(trials[start:stop])
+        return TrialPlan(trials, self.block_starts, self.columns)
+
+
+def plan_key(source, block_starts=BLOCKS):
+    """Return the hash identifying a compiled plan: of the spreadsheet's bytes and the blocks."""
+    digest = hashlib.sha1(('%d %r\n' % (PLAN_VERSION, tuple(block_starts))).encode())
+    with open(source, 'rb') as sheet:
+        digest.update(sheet.read())
+    return digest.hexdigest()
+
+
+def compile_plan(source, plan_file, block_starts=BLOCKS):
+    """Read the spreadsheet, write its compiled plan to plan_file and return the plan.
+
+    Arguments:
+        source -- the spreadsheet, one trial per row with the columns of COLUMNS and no header
+        plan_file -- the .npz file to write
+        block_starts -- the index of the first trial of each block
+    """
+    import pandas # only needed when the spreadsheet has changed
+
+    trials = pandas.read_excel(source, header=None).to_numpy()
+    if trials.dtype == object:
+        raise ValueError('%s: every cell of the trial plan must be a number' % source)
+    plan = TrialPlan(trials, block_starts)
+    partial = plan_file + '.%d.tmp' % os.getpid()
+    with open(partial, 'wb') as compiled:
+        np.savez(compiled, key=np.array(plan_key(source, block_starts)), trials=plan.trials,
+                 block_starts=np.array(plan.block_starts), columns=np.array(plan.columns))
+    os.replace(partial, plan_file)
+    return plan
+
+
+def load_plan(source, block_starts=BLOCKS, plan_file=None):
+    """Return the trial plan of a spreadsheet, compiling it first if it has no up-to-date compiled plan.
+
+    Arguments:
+        source -- the spreadsheet, as for compile_plan
+        block_starts -- the index of the first trial of each block
+        plan_file -- the compiled plan; by default the spreadsheet's name with a .plan.npz extension
+    """
+    if plan_file is None:
+        plan_file = os.path.splitext(source)[0] + '.plan.npz'
+    if os.path.exists(plan_file):
+        with np.load(plan_file) as compiled:
+            if str(compiled['key']) == plan_key(source, block_starts):
+                return TrialPlan(compiled['trials'], compiled['block_starts'], compiled['columns'].tolist())
+    return compile_plan(source, plan_file, block_starts)
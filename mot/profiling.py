@@ -0,0 +1,107 @@
+"""Per-phase timing spans and optional cProfile capture across the trial lifecycle."""
+from collections import defaultdict
+from contextlib import contextmanager
+import cProfile
+import csv
+import functools
+import os
+import time
+
+import numpy as np
+
+
+class NullProfiler:
+    """A profiler that records nothing; the default for trials."""
+    trial = None
+
+    @contextmanager
+    def span(self, name):
+        yield
+
+    def begin_trial(self, index):
+        pass
+
+    def end_trial(self):
+        pass
+
+
+class Profiler(NullProfiler):
+    """Records the wall and CPU time of named spans, per trial.
+
+    Spans can be nested and may come from any thread; each is attributed to
+    the trial that was current when it ended. Trials listed in profile_trials
+    are also run under cProfile and dumped to their own .prof file.
+    """
+    def __init__(self, profile_trials=(), prefix='profile'):
+        """Initialize the profiler.
+
+        Arguments:
+            profile_trials -- the indices of the trials to capture with cProfile
+            prefix -- the path prefix of the .prof files, which end in _trial<index>.prof
+        """
+        self.profile_trials = set(profile_trials)
+        self.prefix = prefix
+        self.spans = defaultdict(list) # name -> [(trial, wall seconds, cpu seconds)]
+        self.trial = None
+        self._capture = None
+
+    @contextmanager
+    def span(self, name):
+        """Time the body of a with statement under the given name."""
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.spans[name].append((self.trial, time.perf_counter() - wall, time.thread_time() - cpu))
+
+    def begin_trial(self, index):
+        """Mark the start of a trial, and start cProfile if it is one of profile_trials."""
+        self.trial = index
+        if index in self.profile_trials:
+            self._capture = cProfile.Profile()
+            self._capture.enable()
+
+    def end_trial(self):
+        """Mark the end of the current trial and write its cProfile capture, if any."""
+        if self._capture is not None:
+            self._capture.disable()
+            directory = os.path.dirname(self.prefix)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._capture.dump_stats('%s_trial%s.prof' % (self.prefix, self.trial))
+            self._capture = None
+        self.trial = None
+
+    def summary(self):
+        """Return one row per span name: count, then total, mean, 95th percentile and
+        longest wall time, and total and mean CPU time, all in milliseconds.
+        """
+        rows = []
+        for name, spans in self.spans.items():
+            wall = 1000*np.array([span[1] for span in spans])
+            cpu = 1000*np.array([span[2] for span in spans])
+            rows.append(dict(phase=name, count=len(spans), wall_total_ms=wall.sum(), wall_mean_ms=wall.mean(),
+                             wall_p95_ms=np.percentile(wall, 95), wall_max_ms=wall.max(),
+                             cpu_total_ms=cpu.sum(), cpu_mean_ms=cpu.mean()))
+        return rows
+
+    def write_summary(self, filename):
+        """Write summary() to a csv file with labelled columns."""
+        rows = self.summary()
+        fieldnames = ['phase', 'count', 'wall_total_ms', 'wall_mean_ms', 'wall_p95_ms', 'wall_max_ms',
+                      'cpu_total_ms', 'cpu_mean_ms']
+        with open(filename, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def phase(name):
+    """Decorate a Trial method so that each call is timed as a span of the trial's profiler."""
+    def decorate(method):
+        @functools.wraps(method)
+        def timed(self, *args, **kwargs):
+            with self.profiler.span(name):
+                return method(self, *args, **kwargs)
+        return timed
+    return decorate
@@ -0,0 +1,185 @@
+"""Per-frame recording of disc trajectories and events, written per trial to a compressed archive.
+
+Every trial becomes a chunk of a session's .npz file (a zip of .npy members
+named trial_NNN/<array>), so np.load reads it back without loading the
+other trials:
+
+    times       -- (frames,) the simulated time of each recorded frame, in seconds
+    frames      -- (frames, objects, 4) float32 x, y, vx and vy of every object
+    event_times -- (events,) the time of each event, in seconds
+    events      -- (events, 3) kind (COLLISION or WALL), disc, and the other disc
+                   of a collision or the axis (0 for x, 1 for y) of a wall bounce
+    bounces     -- (objects,) the number of wall bounces of every object
+    radius, group, bounds -- the objects' collision radii, hemifields and centre limits
+"""
+import zipfile
+
+import numpy as np
+
+COLLISION = 0
+WALL = 1
+
+ARRAYS = ('times', 'frames', 'event_times', 'events', 'bounces', 'radius', 'group', 'bounds')
+
+
+def derive_events(times, frames, bounds, group, reference_rate=60):
+    """Infer a played-back trial's collisions and wall bounces from its recorded frames.
+
+    Events are found at frame resolution: a velocity component that changed
+    sign while the disc was within one frame's travel of its wall is a wall
+    bounce, any other change of velocity a collision with the nearest disc of
+    the same hemifield whose velocity also changed in that frame.
+
+    Arguments:
+        times -- the time of each frame, in seconds
+        frames -- the (frames, objects, 4) x, y, vx and vy of every object
+        bounds -- the left, right, top and bottom limits of every object's centre
+        group -- the hemifield of every object
+        reference_rate -- the frame rate the velocities are expressed in
+    """
+    pos, vel = frames[1:, :, :2], frames[1:, :, 2:]
+    before = frames[:-1, :, 2:]
+    lo = np.column_stack((bounds[:, 0], bounds[:, 3]))
+    hi = np.column_stack((bounds[:, 1], bounds[:, 2]))
+    reach = np.abs(vel) * (reference_rate*np.diff(times))[:, None, None] + 1e-3
+    at_wall = (pos - lo <= reach) | (hi - pos <= reach)
+    wall = (np.sign(vel) == -np.sign(before)) & (before != 0) & at_wall
+    changed = np.any(vel != before, axis=2) & ~wall.any(axis=2)
+
+    event_times, events = [], []
+    f, disc, axis = np.nonzero(wall)
+    event_times.append(times[f + 1])
+    events.append(np.column_stack((np.full(len(f), WALL), disc, axis)))
+
+    for f in np.unique(np.nonzero(changed)[0]):
+        candidates = np.nonzero(changed[f])[0]
+        i, j = np.triu_indices(len(candidates), 1)
+        i, j = candidates[i], candidates[j]
+        same = group[i] == group[j]
+        i, j = i[same], j[same]
+        d = pos[f, i] - pos[f, j]
+        used = set()
+        for k in np.argsort(np.einsum('ij,ij->i', d, d), kind='stable'):
+            if i[k] not in used and j[k] not in used:
+                used.update((i[k], j[k]))
+                event_times.append(times[f + 1:f + 2])
+                events.append(np.array([[COLLISION, i[k], j[k]]]))
+
+    event_times = np.concatenate(event_times)
+    events = np.concatenate(events).astype(np.int32)
+    order = np.argsort(event_times, kind='stable')
+    return event_times[order], events[order]
+
+
+def load_trial(filename, index):
+    """Return the recorded arrays of one trial of a session archive, as a dict keyed by ARRAYS."""
+    with np.load(filename) as archive:
+        return {name: archive['trial_%03d/%s' % (index, name)] for name in ARRAYS}
+
+
+class TrajectoryRecorder:
+    """Records every frame of a trial into preallocated buffers, then writes it to a session archive.
+
+    Recording a frame is two stores into a NumPy array; a physics substep adds
+    a check of the world's contacts and wall bounces, and stores only when
+    there were any. Nothing is allocated, compressed or written during the
+    trial. When the trial is played back from pre-generated trajectories
+    instead of simulated, its events are those logged when the trajectories
+    were generated (see mot.trajectories.load_events), or if they are not
+    given, inferred from the frames when the trial is written (see
+    derive_events).
+    """
+    def __init__(self, filename, capacity=4096, event_capacity=1024, reference_rate=60):
+        """Initialize the recorder.
+
+        Arguments:
+            filename -- the .npz session archive the trials are added to
+            capacity -- the most frames recorded per trial; later frames are counted but not stored
+            event_capacity -- the number of events to preallocate room for; the buffer grows if needed
+            reference_rate -- the frame rate the velocities are expressed in
+        """
+        self.filename = filename
+        self.capacity = capacity
+        self.reference_rate = reference_rate
+        self.times = np.zeros(capacity)
+        self.frames = None
+        self.count = 0
+        self.event_times = np.zeros(event_capacity)
+        self.events = np.zeros((event_capacity, 3), dtype=np.int32)
+        self.event_count = 0
+        self.world = None
+        self.live = True
+        self.played_events = None
+
+    def start(self, world, live=True, events=None):
+        """Forget the previous trial and record the world from now on.
+
+        Arguments:
+            world -- the World of the trial
+            live -- whether the world is simulated, so that its events are logged
+                    by log_step, rather than played back
+            events -- the (event_times, events) of a played-back trajectory, logged
+                      when it was generated
+        """
+        if self.frames is None or self.frames.shape[1] != world.count:
+            self.frames = np.zeros((self.capacity, world.count, 4), dtype=np.float32)
+        self.world = world
+        self.live = live
+        self.played_events = events
+        self.count = 0
+        self.event_count = 0
+
+    def record(self, time):
+        """Store the world's current positions and velocities as the frame shown at time."""
+        k = self.count
+        if k < self.capacity:
+            self.times[k] = time
+            self.frames[k, :, :2] = self.world.pos
+            self.frames[k, :, 2:] = self.world.vel
+        self.count = k + 1
+
+    def log_step(self, time, world):
+        """Store the collisions and wall bounces of the physics step that ended at time."""
+        i, j = world.contacts
+        if len(i):
+            self._log(time, COLLISION, i, j)
+        disc, axis = world.walls
+        if len(disc):
+            self._log(time, WALL, disc, axis)
+
+    def _log(self, time, kind, a, b):
+        k, n = self.event_count, len(a)
+        if k + n > len(self.event_times):
+            capacity = max(2*len(self.event_times), k + n)
+            self.event_times = np.resize(self.event_times, capacity)
+            self.events = np.resize(self.events, (capacity, 3))
+        self.event_times[k:k + n] = time
+        self.events[k:k + n, 0] = kind
+        self.events[k:k + n, 1] = a
+        self.events[k:k + n, 2] = b
+        self.event_count = k + n
+
+    def trial_arrays(self):
+        """Return copies of the current trial's recorded arrays, as a dict keyed by ARRAYS."""
+        count = min(self.count, self.capacity)
+        times, frames = self.times[:count].copy(), self.frames[:count].copy()
+        bounds, group = self.world.bounds, self.world.group.copy()
+        if self.live:
+            event_times = self.event_times[:self.event_count].copy()
+            events = self.events[:self.event_count].copy()
+        elif self.played_events is not None: # those up to the last frame shown
+            event_times, events = self.played_events
+            shown = event_times <= (times[-1] if count else -1)
+            event_times, events = event_times[shown].copy(), events[shown].astype(np.int32)
+        else:
+            event_times, events = derive_events(times, frames, bounds, group, self.reference_rate)
+        bounces = np.bincount(events[events[:, 0] == WALL, 1], minlength=self.world.count)
+        return dict(times=times, frames=frames, event_times=event_times, events=events, bounces=bounces,
+                    radius=self.world.radius.copy(), group=group, bounds=bounds)
+
+    def flush(self, index):
+        """Compress the current trial and add it to the archive as trial index."""
+        with zipfile.ZipFile(self.filename, 'a', zipfile.ZIP_DEFLATED) as archive:
+            for name, array in self.trial_arrays().items():
+                with archive.open('trial_%03d/%s.npy' % (index, name), 'w') as member:
+                    np.lib.format.write_array(member, array)
@@ -0,0 +1,256 @@
+"""Rendering backends for trials: a PsychoPy window, or nothing at all."""
+
+
+class PsychopyRenderer:
+    """Draws trial stimuli into a PsychoPy window."""
+    def __init__(self, window):
+        """Initialize the renderer.
+
+        Arguments:
+            window -- the Psychopy window to draw to
+        """
+        from psychopy import colors, core, visual
+        self._colors = colors
+        self._core = core
+        self._visual = visual
+        self.window = window
+
+    def rect(self, width, height, color):
+        return self._visual.Rect(self.window, width=width, height=height, fillColor=color, units='pix')
+
+    def line(self, start, end, color, width=3):
+        return self._visual.Line(self.window, start=start, end=end, lineWidth=width, units='pix', lineColor=color)
+
+    def circle(self, radius, pos, color):
+        return self._visual.Circle(self.window, radius, pos=pos, lineColor=color, fillColor=color, units='pix')
+
+    def shape(self, vertices, color, line_width=1.5):
+        return self._visual.ShapeStim(self.window, vertices=vertices, fillColor=color, size=.5, lineColor=color,
+                                      lineWidth=line_width, units='pix')
+
+    def disc_array(self, radii, positions, colors):
+        """Return one element array stimulus drawing a filled disc per element.
+
+        Positions are updated in bulk by assigning to its xys, and elements are
+        hidden or shown through its per-element opacities.
+        """
+        rgb = [self._colors.Color(color).rgb for color in colors]
+        return self._visual.ElementArrayStim(self.window, units='pix', nElements=len(radii), xys=positions,
+                                             sizes=[2*r for r in radii], elementTex=None, elementMask='circle',
+                                             colors=rgb, colorSpace='rgb', opacities=1.0, texRes=256)
+
+    def new_trial(self):
+        """Called by Trial.setup before it builds the trial's stimuli."""
+        pass
+
+    def flip(self):
+        """Show the frame and return its flip time."""
+        return self.window.flip()
+
+    def clock(self):
+        return self._core.Clock()
+
+    def wait(self, secs):
+        self._core.wait(secs)
+
+
+class NullStim:
+    """A stimulus that records what was done to it but draws nothing."""
+    def __init__(self, **attributes):
+        self.autoDraw = False
+        self.__dict__.update(attributes)
+
+    def setAutoDraw(self, value):
+        self.autoDraw = value
+
+    def setPos(self, pos):
+        self.pos = pos
+
+    def setVertices(self, vertices):
+        self.vertices = vertices
+
+    def draw(self, window=None):
+        pass
+
+
+class NullClock:
+    """A clock that reads a NullRenderer's simulated time."""
+    def __init__(self, renderer):
+        self.renderer = renderer
+        self.start = renderer.time
+
+    def getTime(self):
+        return self.renderer.time - self.start
+
+    def reset(self):
+        self.start = self.renderer.time
+
+
+class NullRenderer:
+    """A headless renderer; time advances by one refresh per flip instead of in real time.
+
+    Trials run against it at full CPU speed, which makes it suitable for batch
+    generation, benchmarking and profiling without PsychoPy or a display.
+    """
+    window = None
+
+    def __init__(self, refresh_rate=60):
+        """Initialize the renderer.
+
+        Arguments:
+            refresh_rate -- the simulated display refresh rate, in Hz
+        """
+        self.refresh_rate = refresh_rate
+        self.frames = 0
+        self.time = 0.0
+
+    def rect(self, width, height, color):
+        return NullStim(width=width, height=height, color=color)
+
+    def line(self, start, end, color, width=3):
+        return NullStim(start=start, end=end, color=color, lineWidth=width)
+
+    def circle(self, radius, pos, color):
+        return NullStim(radius=radius, pos=pos, color=color)
+
+    def shape(self, vertices, color, line_width=1.5):
+        return NullStim(vertices=vertices, color=color, lineWidth=line_width)
+
+    def disc_array(self, radii, positions, colors):
+        return NullStim(sizes=[2*r for r in radii], xys=positions, colors=colors, opacities=1.0)
+
+    def new_trial(self):
+        pass
+
+    def flip(self):
+        """Count the frame, advance the simulated time and return it."""
+        self.frames += 1
+        self.time += 1.0 / self.refresh_rate
+        return self.time
+
+    def clock(self):
+        return NullClock(self)
+
+    def wait(self, secs):
+        self.time += secs
+
+
+class StimulusPool:
+    """A renderer that builds each stimulus once per session and reuses it on later trials.
+
+    It wraps another renderer and has the same interface. Within a trial the
+    k-th stimulus requested with a given kind and style (size, colour, line
+    width) is always the same object: on reuse it is moved to the new position
+    or given the new vertices instead of being rebuilt. new_trial() hands every
+    stimulus back to the pool and turns its drawing off.
+    """
+    def __init__(self, renderer):
+        """Initialize the pool.
+
+        Arguments:
+            renderer -- the renderer that builds the stimuli, e.g. a PsychopyRenderer
+        """
+        self.renderer = renderer
+        self.window = renderer.window
+        self._stims = {} # (kind, style) -> stimuli built so far
+        self._used = {} # (kind, style) -> stimuli handed out this trial
+
+    def _acquire(self, key, make, reset):
+        stims = self._stims.setdefault(key, [])
+        used = self._used.get(key, 0)
+        if used < len(stims):
+            stim = stims[used]
+            reset(stim)
+        else:
+            stim = make()
+            stims.append(stim)
+        self._used[key] = used + 1
+        return stim
+
+    def rect(self, width, height, color):
+        return self._acquire(('rect', width, height, color),
+                             lambda: self.renderer.rect(width, height, color), lambda stim: None)
+
+    def line(self, start, end, color, width=3):
+        return self._acquire(('line', tuple(start), tuple(end), color, width),
+                             lambda: self.renderer.line(start, end, color, width), lambda stim: None)
+
+    def circle(self, radius, pos, color):
+        return self._acquire(('circle', radius, color),
+                             lambda: self.renderer.circle(radius, pos, color), lambda stim: stim.setPos(pos))
+
+    def shape(self, vertices, color, line_width=1.5):
+        return self._acquire(('shape', color, line_width),
+                             lambda: self.renderer.shape(vertices, color, line_width),
+                             lambda stim: stim.setVertices(vertices))
+
+    def disc_array(self, radii, positions, colors):
+        def reset(stim):
+            stim.xys = positions
+            stim.opacities = 1.0
+        return self._acquire(('disc_array', tuple(float(r) for r in radii), tuple(colors)),
+                             lambda: self.renderer.disc_array(radii, positions, colors), reset)
+
+    def new_trial(self):
+        """Hand every stimulus back to the pool and stop drawing it."""
+        for stims in self._stims.values():
+            for stim in stims:
+                stim.setAutoDraw(False)
+        self._used.clear()
+        self.renderer.new_trial()
+
+    def stats(self):
+        """Return the number of stimuli built, handed out this trial and drawing, by kind."""
+        counts = {}
+        for (kind, *style), stims in self._stims.items():
+            built, in_use, drawing = counts.get(kind, (0, 0, 0))
+            counts[kind] = (built + len(stims), in_use + self._used.get((kind, *style), 0),
+                            drawing + sum(bool(getattr(stim, 'autoDraw', False)) for stim in stims))
+        return {kind: dict(built=built, in_use=in_use, drawing=drawing)
+                for kind, (built, in_use, drawing) in counts.items()}
+
+    def flip(self):
+        return self.renderer.flip()
+
+    def clock(self):
+        return self.renderer.clock()
+
+    def wait(self, secs):
+        self.renderer.wait(secs)
+
+
+class ScaledClock:
+    """A clock running speed times faster than the clock it wraps."""
+    def __init__(self, clock, speed):
+        self.clock = clock
+        self.speed = speed
+
+    def getTime(self):
+        return self.clock.getTime()*self.speed
+
+    def reset(self):
+        self.clock.reset()
+
+
+class TimeScaledRenderer:
+    """A renderer whose clocks run speed times faster (or slower) than real time.
+
+    It wraps another renderer, passing everything else through, so that a trial
+    run with it plays its animation at speed times its normal rate.
+    """
+    def __init__(self, renderer, speed):
+        """Initialize the renderer.
+
+        Arguments:
+            renderer -- the renderer that draws, e.g. a PsychopyRenderer
+            speed -- the playback rate; 4 plays a trial in a quarter of its duration
+        """
+        self.renderer = renderer
+        self.window = renderer.window
+        self.speed = speed
+
+    def __getattr__(self, name):
+        return getattr(self.renderer, name)
+
+    def clock(self):
+        return ScaledClock(self.renderer.clock(), self.speed)
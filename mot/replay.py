@@ -0,0 +1,272 @@
+"""Deterministic replay and audit of recorded sessions.
+
+A session is determined by its seed, its trial duration and the task's
+settings: the trial order is the plan shuffled from the seed, and every
+trial's motion is the session's pre-generated trajectories (see
+mot.trajectories). The results file holds the seed (SEED), the duration
+(TRIAL_DUR; inferred for older files), the rate the trajectories were
+sampled at (TRAJECTORY_RATE), the queried object (TARGET_INDEX), its state
+when it was scored and where the response ended, so every trial can be
+rebuilt and its score checked. When the session's trajectory archive is next
+to its results (see mot.recorder), trials are rebuilt from the recorded
+frames instead, which also covers sessions simulated live.
+
+Older files do not name the queried object. It is then drawn again from the
+trial's stream as Trial.remove_smart drew it: the stream's first draw when
+the trial was played back, and the draw after those of placement when it was
+simulated live. Whichever of the two is in the recorded state is taken.
+
+Run with
+
+    python -m mot.replay RESULTS.csv                   # audit every trial, headless
+    python -m mot.replay RESULTS.csv --show 12 --speed 4   # watch trial 12 at four times its speed
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from mot.plan import load_plan
+from mot.render import NullRenderer, TimeScaledRenderer
+from mot.results import committed_rows
+from mot.trajectories import load_session, trial_rng
+from mot.trial import Trial, queried_side
+
+DURATIONS = (6, 7, 8) # the trial durations the task draws a session's from, tried for files without TRIAL_DUR
+STATE = ('TARGET_X', 'TARGET_Y', 'TARGET_VX', 'TARGET_VY')
+
+
+class SessionReplay:
+    """Rebuilds the trials of a recorded session and checks them against its results."""
+    def __init__(self, results_file, plan, num_objects=8, object_size=50, physics_rate=240, frame_rate=60,
+                 trial_duration=None, cache_dir='trajectory_cache'):
+        """Load a session's results and its trajectories.
+
+        Arguments:
+            results_file -- the session's results csv
+            plan -- the TrialPlan the session was run from, before shuffling
+            num_objects, object_size, physics_rate -- the task's settings, as for Trial
+            frame_rate -- the rate the trajectories were sampled at, for results without TRAJECTORY_RATE
+            trial_duration -- the trial duration, for results without TRIAL_DUR; by default
+                              found among DURATIONS
+            cache_dir -- the directory of the cached trajectories
+        """
+        self.rows = committed_rows(results_file)
+        if not self.rows or not self.rows[0].get('SEED'):
+            raise ValueError('%s has no trials with a SEED; only seeded sessions can be replayed' % results_file)
+        self.seed = int(self.rows[0]['SEED'])
+        self.plan = plan
+        self.order = plan.shuffled(self.seed)
+        self.num_objects = num_objects
+        self.object_size = object_size
+        self.physics_rate = physics_rate
+        self.frame_rate = frame_rate
+        self.cache_dir = cache_dir
+        self._sessions = {} # the session's trajectories, by trial duration and rate
+        archive = os.path.splitext(results_file)[0] + '_trajectories.npz'
+        self.archive = np.load(archive) if os.path.exists(archive) else None
+        if trial_duration is None and not self.rows[0].get('TRIAL_DUR'):
+            trial_duration = self._find_duration()
+        self.trial_duration = trial_duration
+
+    def settings(self, index):
+        """Return the trial duration and the trajectory rate of trial index."""
+        row = self.rows[index]
+        trial_duration = _number(row['TRIAL_DUR']) if row.get('TRIAL_DUR') else self.trial_duration
+        frame_rate = _number(row['TRAJECTORY_RATE']) if row.get('TRAJECTORY_RATE') else self.frame_rate
+        return trial_duration, frame_rate
+
+    def trajectories(self, index):
+        """Return the pre-generated trajectory of trial index."""
+        return self._session(*self.settings(index))[index]
+
+    def _session(self, trial_duration, frame_rate):
+        if (trial_duration, frame_rate) not in self._sessions:
+            self._sessions[trial_duration, frame_rate] = np.asarray(load_session(
+                self.seed, len(self.plan), self.num_objects, self.object_size, trial_duration, frame_rate=frame_rate,
+                physics_rate=self.physics_rate, cache_dir=self.cache_dir))
+        return self._sessions[trial_duration, frame_rate]
+
+    def _find_duration(self):
+        for trial_duration in DURATIONS:
+            if self._match(self._session(trial_duration, self.frame_rate)[0], 0)[1] is not None:
+                return trial_duration
+        raise ValueError('no trial duration in %r reproduces the first trial of the session' % (DURATIONS,))
+
+    def targets(self, index):
+        """Return the objects that may have been queried on trial index, the likeliest first.
+
+        This is the one recorded in TARGET_INDEX, or for older results the
+        object a played-back and a live trial would have drawn.
+        """
+        row = self.rows[index]
+        if row.get('TARGET_INDEX'):
+            return [int(float(row['TARGET_INDEX']))]
+        half = self.num_objects//2
+        side = queried_side(float(row['Left']), float(row['Questioned']))
+        lo, hi = (0, half) if side == 0 else (half, self.num_objects)
+        live = trial_rng(self.seed, index) # placement draws from the stream first in a live trial
+        Trial(NullRenderer(), None, None, None, self.num_objects, [None]*self.num_objects, self.object_size,
+              ['circle']*self.num_objects, 1, self.physics_rate, rng=live).place()
+        return [trial_rng(self.seed, index).randrange(lo, hi), live.randrange(lo, hi)]
+
+    def frames(self, index):
+        """Return the frames of trial index and the rate they were taken at.
+
+        These are the frames recorded during the session when its trajectory
+        archive (<results file>_trajectories.npz, see mot.recorder) holds the
+        trial, and the trial's pre-generated trajectory otherwise.
+        """
+        name = 'trial_%03d/frames' % index
+        if self.archive is not None and name in self.archive.files:
+            times = self.archive['trial_%03d/times' % index]
+            rate = 1 / np.median(np.diff(times)) if len(times) > 1 else self.settings(index)[1]
+            return self.archive[name].astype(float), rate
+        return self.trajectories(index), self.settings(index)[1]
+
+    def match(self, index, tolerance=1e-3):
+        """Return the queried object of trial index and the last of its frames in which that
+        object is in its recorded state; (None, None) if no frame is.
+        """
+        return self._match(self.frames(index)[0], index, tolerance)
+
+    def _match(self, frames, index, tolerance=1e-3):
+        row = self.rows[index]
+        if not row.get(STATE[0]):
+            return None, None
+        recorded = np.array([float(row[name]) for name in STATE])
+        for target in self.targets(index):
+            matches = np.nonzero(np.abs(frames[:, target] - recorded).max(axis=1) <= tolerance)[0]
+            if len(matches):
+                return target, int(matches[-1])
+        return None, None
+
+    def trial(self, index, renderer=None, speed=1.0):
+        """Return trial index rebuilt to play back its trajectory, drawn with renderer (headless by default)
+        at speed times its normal rate.
+        """
+        frames, rate = self.frames(index)
+        renderer = renderer if renderer is not None else NullRenderer(rate)
+        if speed != 1:
+            renderer = TimeScaledRenderer(renderer, speed)
+        return Trial(renderer, None, 'gray', 'black', self.num_objects, ['black']*self.num_objects, self.object_size,
+                     ['circle']*self.num_objects, self.settings(index)[0], self.physics_rate, rng=trial_rng(self.seed, index),
+                     trajectory=frames, trajectory_rate=rate, batch_draw=True)
+
+    def audit_trial(self, index, scorer=None):
+        """Rebuild trial index and check it against its results.
+
+        Returns a dict of the trial's index, status, the recorded and replayed ERROR_D
+        and SCORE, and the trajectory frame it was scored on. The status is 'ok',
+        'order' (the trial is not the one the plan puts there), 'unverifiable'
+        (the results have no queried object state or response), 'state' (no frame
+        of the trajectory has the recorded state) or 'score' (the score differs).
+
+        Arguments:
+            index -- the trial's position in the session
+            scorer -- a prepared Trial of the session to score with, reused between calls
+        """
+        row = self.rows[index]
+        result = dict(index=index, status='ok', frame=None, error=None, score=None,
+                      recorded_error=float(row['ERROR_D']) if row['ERROR_D'] else None,
+                      recorded_score=int(float(row['SCORE'])) if row['SCORE'] else None)
+        if int(float(row['Number'])) != int(self.order[index]['Number']):
+            result['status'] = 'order'
+            return result
+        if not row.get('RESPONSE_X') or not row.get(STATE[0]):
+            result['status'] = 'unverifiable'
+            return result
+        target, frame = self.match(index)
+        if frame is None:
+            result['status'] = 'state'
+            return result
+
+        scorer = scorer if scorer is not None else self.trial(index)
+        scorer.prepare()
+        state = self.frames(index)[0][frame]
+        scorer.world.pos[:] = state[:, :2]
+        scorer.world.vel[:] = state[:, 2:]
+        # the frame locates the trial; the queried object is scored from its recorded state, which
+        # holds the full precision the task scored with (archived frames are float32)
+        scorer.world.pos[target] = [float(row['TARGET_X']), float(row['TARGET_Y'])]
+        scorer.world.vel[target] = [float(row['TARGET_VX']), float(row['TARGET_VY'])]
+        scorer.to_stay = target
+        scorer.score_response(float(row['RESPONSE_X']), float(row['RESPONSE_Y']))
+        result.update(frame=frame, error=scorer.error, score=scorer.score)
+        if (abs(scorer.error - result['recorded_error']) > 1e-6*max(1, abs(result['recorded_error']))
+                or scorer.score != result['recorded_score']):
+            result['status'] = 'score'
+        return result
+
+    def audit(self):
+        """Audit every recorded trial of the session and return the list of results of audit_trial."""
+        scorer = self.trial(0)
+        scorer.prepare()
+        return [self.audit_trial(index, scorer) for index in range(len(self.rows))]
+
+    def show(self, index, renderer, speed=1.0):
+        """Play trial index at speed times its normal rate, then show the queried object with the
+        participant's recorded response and the feedback arrow.
+        """
+        trial = self.trial(index, renderer, speed)
+        trial.setup()
+        trial.run()
+        target, frame = self.match(index)
+        if frame is not None: # end on the frame the response was given to
+            state = trial.trajectory[frame]
+            trial.world.pos[:] = state[:, :2]
+            trial.world.vel[:] = state[:, 2:]
+            trial.discs.xys = trial.world.pos
+        row = self.rows[index]
+        trial.keep_only(target if target is not None else self.targets(index)[0])
+        target = trial.objects[trial.to_stay]
+        x, y = 2*target.pos[0], 2*target.pos[1]
+        if row.get('RESPONSE_X'):
+            line = trial.renderer.shape([(x, y), (2*float(row['RESPONSE_X']), 2*float(row['RESPONSE_Y']))], 'white',
+                                        line_width=3)
+            line.setAutoDraw(True)
+            xcirc, ycirc, unknown = trial.feedback_point()
+            trial.draw_arrow(x, y, xcirc*2, ycirc*2, unknown, line)
+        trial.clear()
+
+
+def _number(text):
+    value = float(text)
+    return int(value) if value.is_integer() else value # as the task passed it, so the cache key matches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay or audit a recorded session.')
+    parser.add_argument('results', help='the session\'s results csv')
+    parser.add_argument('--plan', default='Set_Up_Trial.xlsx', help='the trial plan spreadsheet')
+    parser.add_argument('--show', type=int, nargs='+', metavar='TRIAL', help='trials to watch instead of auditing')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback rate when watching')
+    args = parser.parse_args(argv)
+
+    replay = SessionReplay(args.results, load_plan(args.plan))
+    if args.show:
+        from psychopy import visual
+        from mot.render import PsychopyRenderer
+        window = visual.Window([1200, 900], units='pix', monitor='testMonitor', color='white')
+        renderer = PsychopyRenderer(window)
+        for index in args.show:
+            replay.show(index, renderer, args.speed)
+        window.close()
+        return 0
+
+    results = replay.audit()
+    for result in results:
+        if result['status'] != 'ok':
+            print('trial %(index)d: %(status)s (recorded error %(recorded_error)s, score %(recorded_score)s; '
+                  'replayed %(error)s, %(score)s)' % result)
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print('seed %d, %g s trials: %s' % (replay.seed, replay.settings(0)[0],
+                                        ', '.join('%d %s' % (n, status) for status, n in sorted(counts.items()))))
+    return 0 if set(counts) <= {'ok', 'unverifiable'} else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Non-spinning response input with monotonic, high-resolution timestamps."""
+import time
+
+
+class ResponseInput:
+    """Waits for mouse clicks and key presses without pinning a CPU core.
+
+    Between polls the waiting thread sleeps for poll_interval, leaving the CPU
+    to the rest of the process. Every response is stamped with PsychoPy's
+    monotonic high-resolution clock (core.getTime), the same clock that
+    window.flip() reports flip times in, so a reaction time is simply the
+    response time minus the flip time of the frame that showed the stimulus.
+    """
+    def __init__(self, window, mouse, poll_interval=0.001):
+        """Initialize the input layer.
+
+        Arguments:
+            window -- the Psychopy window receiving the input
+            mouse -- the active mouse to monitor for input
+            poll_interval -- the time to sleep between polls, in seconds
+        """
+        from psychopy import core, event
+        self._core = core
+        self._event = event
+        self.window = window
+        self.mouse = mouse
+        self.poll_interval = poll_interval
+
+    def now(self):
+        """Return the current time on the monotonic clock."""
+        return self._core.getTime()
+
+    def wait_click(self, inside=None, button=0):
+        """Wait for a mouse click and return its position and time.
+
+        Arguments:
+            inside -- an optional function of the click position; clicks for which it
+                      returns False are ignored
+            button -- the mouse button to wait for (0 is the left button)
+        """
+        while True:
+            if self.mouse.getPressed()[button]:
+                click_time = self.now()
+                pos = self.mouse.getPos()
+                if inside is None or inside(pos):
+                    return pos, click_time
+            time.sleep(self.poll_interval)
+
+    def get_keys(self, keys):
+        """Return the (key, time) pairs of presses of keys since the last call, without waiting."""
+        return self._event.getKeys(keyList=keys, timeStamped=True)
+
+    def wait_keys(self, keys):
+        """Wait until any of keys is pressed and return the (key, time) pairs of the presses."""
+        while True:
+            pressed = self.get_keys(keys)
+            if pressed:
+                return pressed
+            time.sleep(self.poll_interval)
+
+    def clear(self):
+        """Discard pending input events."""
+        self._event.clearEvents()
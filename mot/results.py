@@ -0,0 +1,104 @@
+"""Crash-safe, streaming trial results: an append-only csv written from a background thread."""
+import csv
+import os
+import queue
+import threading
+import time
+
+# The columns of a session's results file, one row per trial
+FIELDNAMES = ['Number', 'Type', 'Left', 'Right', 'Questioned', 'ERROR_D', 'ACTIVATE_RT', 'RESPONSE_RT', 'SCORE',
+              'FRAME_MEAN_MS', 'FRAME_P95_MS', 'FRAME_MAX_MS', 'DROPPED_FRAMES', 'FRAME_FLAG', 'SEED',
+              'TARGET_X', 'TARGET_Y', 'TARGET_VX', 'TARGET_VY', 'RESPONSE_X', 'RESPONSE_Y', 'TRIAL_DUR',
+              'TRAJECTORY_RATE', 'TARGET_INDEX']
+
+_CLOSE = object()
+
+
+def committed_rows(filename):
+    """Return the complete rows already in a results file, as dicts keyed by its header.
+
+    A last line cut short by a crash is ignored. Returns an empty list if the
+    file does not exist.
+    """
+    if not os.path.exists(filename):
+        return []
+    with open(filename, newline='') as csvfile:
+        text = csvfile.read()
+    text = text[:text.rfind('\n') + 1]
+    return list(csv.DictReader(text.splitlines()))
+
+
+class ResultWriter:
+    """Appends one csv row per trial as soon as the trial ends.
+
+    write() only puts the row on a queue, so it never blocks the caller; a
+    background thread writes and flushes each row, and fsyncs the file at most
+    every fsync_interval seconds and on close(). Rows already in the file are
+    kept, so an interrupted session can be resumed by opening its file again
+    (see committed_rows).
+    """
+    def __init__(self, filename, fieldnames, fsync_interval=2.0):
+        """Open the results file, writing the header if it is new.
+
+        Arguments:
+            filename -- string of the file name, including the extension
+            fieldnames -- a list of column names
+            fsync_interval -- the longest time, in seconds, a written row may wait to reach the disk
+        """
+        self.filename = filename
+        self.fieldnames = fieldnames
+        self.fsync_interval = fsync_interval
+        self._file = open(filename, 'a+', newline='')
+        self._synced = time.monotonic()
+        self._repair()
+        self._writer = csv.writer(self._file)
+        if self._file.tell() == 0:
+            self._writer.writerow(fieldnames)
+            self._sync()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='result-writer', daemon=True)
+        self._thread.start()
+
+    def _repair(self):
+        """Cut off a last line left incomplete by a crash, so appended rows start on a new line."""
+        self._file.seek(0)
+        text = self._file.read()
+        if text and not text.endswith('\n'):
+            self._file.truncate(len(text[:text.rfind('\n') + 1].encode()))
+        self._file.seek(0, os.SEEK_END)
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced = time.monotonic()
+
+    def _run(self):
+        pending = False # rows written since the last fsync
+        while True:
+            timeout = max(self.fsync_interval - (time.monotonic() - self._synced), 0) if pending else None
+            try:
+                row = self._queue.get(timeout=timeout)
+            except queue.Empty: # no row came within the interval: sync the waiting ones now
+                self._sync()
+                pending = False
+                continue
+            if row is _CLOSE:
+                break
+            self._writer.writerow(row)
+            self._file.flush()
+            pending = True
+            if time.monotonic() - self._synced >= self.fsync_interval:
+                self._sync()
+                pending = False
+        self._sync()
+        self._file.close()
+
+    def write(self, row):
+        """Queue a row (a list as long as the fieldnames) for writing and return at once."""
+        self._queue.put(list(row))
+
+    def close(self):
+        """Write every queued row, fsync the file and close it."""
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
@@ -0,0 +1,43 @@
+"""Pipelined preparation of upcoming trials on a background thread."""
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TrialScheduler:
+    """Builds and prepares trials on a worker thread ahead of when they are needed.
+
+    Calling prefetch(n + 1) as soon as trial n has finished its animation lets
+    placement and trajectory loading for the next trial overlap with the
+    response and feedback phase, so get(n + 1) normally returns at once.
+    Stimuli are still created by Trial.setup() on the main thread.
+    """
+    def __init__(self, make_trial):
+        """Initialize the scheduler.
+
+        Arguments:
+            make_trial -- a function taking a trial index and returning a new Trial
+        """
+        self.make_trial = make_trial
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trial-prep')
+        self._pending = {}
+
+    def _build(self, index):
+        trial = self.make_trial(index)
+        trial.prepare()
+        return trial
+
+    def prefetch(self, index):
+        """Start preparing the trial with the given index, if it is not already under way."""
+        if index not in self._pending:
+            self._pending[index] = self._executor.submit(self._build, index)
+
+    def get(self, index):
+        """Return the prepared trial with the given index, waiting for it if need be."""
+        self.prefetch(index)
+        return self._pending.pop(index).result()
+
+    def close(self):
+        """Stop the worker, dropping trials that were never collected."""
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,115 @@
+"""Angular error scoring, for one response or for whole arrays of trials and sessions.
+
+The error of a response is the signed angle, in degrees, from the queried
+object's direction of motion to the direction from the object to the point the
+response ended at; positive is anticlockwise. It is computed with atan2 of the
+cross and dot products, which stays accurate near 0 and 180 degrees where the
+cosine rule loses precision. A response scores when the size of its error is
+at most the threshold.
+
+Run with
+
+    python -m mot.scoring RESULTS.csv [...] --thresholds 10 20 30
+
+to re-score recorded sessions and print a summary per block.
+"""
+import argparse
+import math
+import sys
+
+import numpy as np
+
+from mot.plan import BLOCKS
+
+THRESHOLD = 20 # the largest error, in degrees, that scores a point in the task
+
+
+def angular_error(x, y, vx, vy, response_x, response_y):
+    """Return the signed error, in degrees, of one response towards (response_x, response_y)
+    for an object at (x, y) moving with velocity (vx, vy).
+    """
+    dx, dy = response_x - x, response_y - y
+    return math.degrees(math.atan2(vx*dy - vy*dx, vx*dx + vy*dy))
+
+
+def angular_errors(positions, velocities, responses):
+    """Return the signed errors, in degrees, of many responses at once.
+
+    Arguments:
+        positions -- an (..., 2) array of the queried objects' positions
+        velocities -- an (..., 2) array of their velocities
+        responses -- an (..., 2) array of the points the responses ended at
+    """
+    positions, velocities = np.asarray(positions, dtype=float), np.asarray(velocities, dtype=float)
+    d = np.asarray(responses, dtype=float) - positions
+    cross = velocities[..., 0]*d[..., 1] - velocities[..., 1]*d[..., 0]
+    dot = np.einsum('...i,...i->...', velocities, d)
+    return np.degrees(np.arctan2(cross, dot))
+
+
+def scores(errors, thresholds=THRESHOLD):
+    """Return whether each error scores under each threshold.
+
+    The result has the shape of thresholds followed by the shape of errors, so
+    scores(errors, [10, 20, 30])[1] are the scores at 20 degrees.
+    """
+    thresholds = np.asarray(thresholds, dtype=float)
+    return np.abs(errors) <= thresholds.reshape(thresholds.shape + (1,)*np.ndim(errors))
+
+
+def summarize(errors, groups, thresholds=(THRESHOLD,)):
+    """Summarize the errors of each group in one pass: count, mean and sd of the size of
+    the error, mean signed error, and the proportion scoring under each threshold.
+
+    Returns a dict of arrays indexed by group label (0 to the largest label);
+    'accuracy' has a row per threshold.
+
+    Arguments:
+        errors -- an array of signed errors, in degrees
+        groups -- an array of the same shape giving each error's group label, e.g. its block
+        thresholds -- the thresholds to score under, in degrees
+    """
+    errors = np.ravel(errors)
+    groups = np.ravel(groups).astype(np.int64)
+    size = np.abs(errors)
+    length = groups.max() + 1 if len(groups) else 0
+    n = np.bincount(groups, minlength=length)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(groups, size, length) / n
+        sd = np.sqrt(np.maximum(np.bincount(groups, size*size, length) / n - mean*mean, 0))
+        bias = np.bincount(groups, errors, length) / n
+        accuracy = np.array([np.bincount(groups, hit, length) for hit in scores(errors, thresholds)]) / n
+    return dict(n=n, mean_error=mean, sd_error=sd, mean_signed_error=bias, accuracy=accuracy)
+
+
+def session_arrays(rows, block_starts=BLOCKS):
+    """Return the queried objects' positions and velocities, the response end points and the
+    block of every trial of a session, from its result rows (see mot.results.committed_rows).
+    """
+    columns = np.array([[float(row[name]) for name in ('TARGET_X', 'TARGET_Y', 'TARGET_VX', 'TARGET_VY',
+                                                        'RESPONSE_X', 'RESPONSE_Y')] for row in rows]).reshape(-1, 6)
+    blocks = np.searchsorted(block_starts, np.arange(len(rows)), side='right') - 1
+    return columns[:, :2], columns[:, 2:4], columns[:, 4:], blocks
+
+
+def main(argv=None):
+    from mot.results import committed_rows
+
+    parser = argparse.ArgumentParser(description='Re-score recorded sessions and summarize them per block.')
+    parser.add_argument('results', nargs='+', help='result csv files of sessions')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[THRESHOLD], help='thresholds, in degrees')
+    args = parser.parse_args(argv)
+
+    arrays = [session_arrays(committed_rows(filename)) for filename in args.results]
+    positions, velocities, responses, blocks = (np.concatenate(parts) for parts in zip(*arrays))
+    summary = summarize(angular_errors(positions, velocities, responses), blocks, args.thresholds)
+    print('block      n  mean |error|  sd  bias  ' + '  '.join('acc@%g' % t for t in args.thresholds))
+    for block in range(len(summary['n'])):
+        print('%5d  %5d  %12.1f  %4.1f  %4.1f  ' % (block, summary['n'][block], summary['mean_error'][block],
+                                                     summary['sd_error'][block], summary['mean_signed_error'][block])
+              + '  '.join('%6.3f' % a for a in summary['accuracy'][:, block]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
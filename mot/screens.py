@@ -0,0 +1,45 @@
+"""A bounded cache of composed, pre-rendered screens."""
+from collections import OrderedDict
+
+
+class ScreenCache:
+    """A least-recently-used cache of screens keyed by their content.
+
+    A screen is whatever its build function returns, typically the list of
+    stimuli that make it up. Building text stimuli is where the layout and
+    glyph rendering cost lies, so a screen that is shown again is only drawn.
+    """
+    def __init__(self, maxsize=64):
+        """Initialize an empty cache.
+
+        Arguments:
+            maxsize -- the number of screens kept; the least recently used is evicted first
+        """
+        self.maxsize = maxsize
+        self._screens = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        """Return the screen for key, calling build() to make it if it is not cached.
+
+        Arguments:
+            key -- a hashable description of the screen's content
+            build -- a function taking no arguments and returning the screen
+        """
+        if key in self._screens:
+            self._screens.move_to_end(key)
+            self.hits += 1
+            return self._screens[key]
+        self.misses += 1
+        screen = build()
+        self._screens[key] = screen
+        if len(self._screens) > self.maxsize:
+            self._screens.popitem(last=False)
+        return screen
+
+    def __contains__(self, key):
+        return key in self._screens
+
+    def __len__(self):
+        return len(self._screens)
@@ -0,0 +1,269 @@
+"""A columnar store of the results of many sessions, with a small query API.
+
+Sessions are ingested from their results csv files once. The store is a
+directory holding one .npy file per column, over the rows of every session,
+and an index (index.json) of the subjects and sessions. The rows are kept
+sorted by subject and date, so each session is a contiguous partition of
+every column. Queries read only the columns they need, memory-mapped, and
+select rows by partition before filtering on block and trial Type. A query
+over every session is a handful of vectorized operations, without re-reading
+any csv.
+
+    python -m mot.store results_store data/*.csv # ingest, from the command line
+
+    store = ResultStore('results_store')
+    store.ingest(glob.glob('data/*.csv'))
+    store.score_by_priority(block=[1, 2, 3])
+    store.rt_percentiles('RESPONSE_RT', subject='P07')
+"""
+import csv
+import json
+import os
+import sys
+
+import numpy as np
+
+from mot.plan import BLOCKS
+from mot.results import FIELDNAMES, committed_rows
+from mot.trial import queried_side
+
+# Columns kept for every trial besides those of the results files
+DERIVED = ('subject', 'session', 'trial', 'block', 'priority')
+
+
+def read_session(filename):
+    """Return the rows of a results file as a dict of float arrays keyed by column name.
+
+    Files written before the results had a header row are read with the
+    leading FIELDNAMES as their column names. Empty cells are NaN. Raises
+    ValueError if the file is not a results file, e.g. the profile summary
+    (<SubjID>_<Date>_profile.csv) written next to one.
+    """
+    with open(filename, newline='') as csvfile:
+        first = next(csv.reader(csvfile), [])
+        header = first[:1] == FIELDNAMES[:1]
+        if not header:
+            if first and (not _is_number(first[0]) or len(first) > len(FIELDNAMES)):
+                raise ValueError('%s is not a results file: it starts with %r' % (filename, ','.join(first[:3])))
+            csvfile.seek(0)
+            rows = [dict(zip(FIELDNAMES, values)) for values in csv.reader(csvfile) if values]
+    if header:
+        rows = committed_rows(filename)
+    columns = {}
+    for name in rows[0] if rows else ():
+        try:
+            columns[name] = np.array([float(row[name]) if row[name] not in ('', None) else np.nan for row in rows])
+        except ValueError as e:
+            raise ValueError('%s is not a results file: column %s: %s' % (filename, name, e))
+    return columns
+
+
+def _is_number(text):
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+def session_name(filename):
+    """Return the subject and date of a results file named SubjID_Date.csv."""
+    subject, _, date = os.path.splitext(os.path.basename(filename))[0].partition('_')
+    return subject, date
+
+
+class ResultStore:
+    """A directory of result columns with an index of subjects and sessions.
+
+    Every column is a float64 .npy file with a row per trial: the FIELDNAMES of
+    the results files, and subject (a code into subjects), session (a code
+    into sessions), trial (the position in the session), block (see
+    mot.plan.BLOCKS) and priority (of the queried side).
+    """
+    def __init__(self, path, block_starts=BLOCKS):
+        """Open the store at path, creating it if it does not exist.
+
+        Arguments:
+            path -- the store's directory
+            block_starts -- the index of the first trial of each block of a session
+        """
+        self.path = path
+        self.block_starts = block_starts
+        os.makedirs(path, exist_ok=True)
+        index = os.path.join(path, 'index.json')
+        if os.path.exists(index):
+            with open(index) as f:
+                self.index = json.load(f)
+        else:
+            self.index = dict(columns=[], subjects=[], sessions=[])
+        self._columns = {}
+        self.skipped = [] # (file, reason) of the files the last ingest could not read
+
+    @property
+    def subjects(self):
+        return self.index['subjects']
+
+    @property
+    def sessions(self):
+        """The sessions, in row order, as dicts of subject, date, source file and first and last row + 1."""
+        return self.index['sessions']
+
+    def __len__(self):
+        return self.sessions[-1]['stop'] if self.sessions else 0
+
+    def column(self, name):
+        """Return a whole column, memory-mapped."""
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r')
+        return self._columns[name]
+
+    def ingest(self, filenames):
+        """Add the sessions of the given results files that are not in the store yet, and return how many were added.
+
+        A session is identified by its subject and date, taken from the file name
+        (see session_name). The columns are rewritten once for the whole batch.
+        Files that are not results files are left out and listed in skipped, so a
+        glob over a data directory can be ingested as it is.
+        """
+        known = {(session['subject'], session['date']) for session in self.sessions}
+        new = []
+        self.skipped = []
+        for filename in filenames:
+            subject, date = session_name(filename)
+            if (subject, date) in known:
+                continue
+            try:
+                columns = read_session(filename)
+            except ValueError as e:
+                self.skipped.append((filename, str(e)))
+                continue
+            if not columns:
+                continue
+            known.add((subject, date))
+            new.append((subject, date, filename, columns))
+        if not new:
+            return 0
+
+        names = [name for name in dict.fromkeys(self.index['columns'] + [name for *_, columns in new for name in columns])
+                 if name not in DERIVED]
+        parts = [] # (subject, date, source, {name: array}) of every session, old and new
+        for session in self.sessions:
+            rows = slice(session['start'], session['stop'])
+            parts.append((session['subject'], session['date'], session['source'],
+                          {name: np.asarray(self.column(name)[rows]) for name in names if name in self.index['columns']}))
+        parts += new
+        parts.sort(key=lambda part: (part[0], part[1]))
+
+        subjects = sorted({part[0] for part in parts})
+        sessions, out, start = [], {name: [] for name in names + list(DERIVED)}, 0
+        for code, (subject, date, source, columns) in enumerate(parts):
+            n = len(next(iter(columns.values())))
+            for name in names:
+                out[name].append(columns.get(name, np.full(n, np.nan)))
+            trial = np.arange(n)
+            side = np.array([queried_side(left, questioned) for left, questioned
+                             in zip(columns['Left'].tolist(), columns['Questioned'].tolist())])
+            out['subject'].append(np.full(n, subjects.index(subject), dtype=float))
+            out['session'].append(np.full(n, code, dtype=float))
+            out['trial'].append(trial.astype(float))
+            out['block'].append((np.searchsorted(self.block_starts, trial, side='right') - 1).astype(float))
+            out['priority'].append(np.where(side == 0, columns['Left'], columns['Right']))
+            sessions.append(dict(subject=subject, date=date, source=source, start=start, stop=start + n))
+            start += n
+
+        self._columns = {}
+        for name, arrays in out.items():
+            partial = os.path.join(self.path, name + '.npy.tmp')
+            with open(partial, 'wb') as f:
+                np.save(f, np.concatenate(arrays))
+            os.replace(partial, os.path.join(self.path, name + '.npy'))
+        self.index = dict(columns=names + list(DERIVED), subjects=subjects, sessions=sessions)
+        partial = os.path.join(self.path, 'index.json.tmp')
+        with open(partial, 'w') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(partial, os.path.join(self.path, 'index.json'))
+        return len(new)
+
+    def rows(self, subject=None, date=None, block=None, type=None):
+        """Return the indices of the rows matching every filter given.
+
+        Arguments:
+            subject -- a SubjID or a list of them
+            date -- a session date, a prefix of one (e.g. '2024-05'), or a (first, last) range of dates
+            block -- a block number or a list of them
+            type -- a trial Type or a list of them
+        """
+        if subject is None and date is None:
+            rows = np.arange(len(self))
+        else:
+            subjects = None if subject is None else set(np.atleast_1d(subject).tolist())
+            ranges = [np.arange(s['start'], s['stop']) for s in self.sessions
+                      if (subjects is None or s['subject'] in subjects) and _date_matches(s['date'], date)]
+            rows = np.concatenate(ranges) if ranges else np.zeros(0, dtype=np.int64)
+        for name, value in (('block', block), ('Type', type)):
+            if value is not None:
+                rows = rows[np.isin(self.column(name)[rows], np.atleast_1d(value))]
+        return rows
+
+    def select(self, names, **filters):
+        """Return the given columns of the rows matching filters (see rows), as a dict of arrays."""
+        rows = self.rows(**filters)
+        return {name: self.column(name)[rows] for name in names}
+
+    def score_by_priority(self, **filters):
+        """Return the number of trials and proportion scored of each priority of the queried side.
+
+        Returns a dict mapping priority to (trials, proportion correct).
+        """
+        data = self.select(['priority', 'SCORE'], **filters)
+        priorities, groups = np.unique(data['priority'], return_inverse=True)
+        n = np.bincount(groups, minlength=len(priorities))
+        correct = np.bincount(groups, data['SCORE'] == 1, len(priorities))
+        return {float(p): (int(k), float(c / k)) for p, k, c in zip(priorities, n, correct)}
+
+    def rt_percentiles(self, name='RESPONSE_RT', percentiles=(5, 25, 50, 75, 95), by='priority', **filters):
+        """Return the percentiles of a reaction time column in each group of the column by.
+
+        Returns a dict mapping each value of by to the list of percentiles, in seconds.
+
+        Arguments:
+            name -- the reaction time column, ACTIVATE_RT or RESPONSE_RT
+            percentiles -- the percentiles to compute
+            by -- the column to group by, e.g. priority, block, Type or subject
+            filters -- as for rows
+        """
+        data = self.select([name, by], **filters)
+        times, groups = data[name], data[by]
+        keep = ~np.isnan(times)
+        times, groups = times[keep], groups[keep]
+        order = np.argsort(groups, kind='stable')
+        times, groups = times[order], groups[order]
+        values, starts = np.unique(groups, return_index=True)
+        return {float(value): np.percentile(part, percentiles).tolist()
+                for value, part in zip(values, np.split(times, starts[1:]))}
+
+
+def _date_matches(date, query):
+    if query is None:
+        return True
+    if isinstance(query, (tuple, list)):
+        return query[0] <= date <= query[1]
+    return date.startswith(query)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
+        print('usage: python -m mot.store STORE RESULTS.csv [...]')
+        return 2
+    store = ResultStore(argv[0])
+    added = store.ingest(argv[1:])
+    for filename, reason in store.skipped:
+        print('skipped %s' % reason)
+    print('added %d sessions; %d sessions of %d subjects, %d trials' % (added, len(store.sessions),
+                                                                       len(store.subjects), len(store)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
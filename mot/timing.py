@@ -0,0 +1,50 @@
+"""Frame timing capture and dropped-frame reporting for trials."""
+import numpy as np
+
+
+class FrameTimer:
+    """Records the flip times of a trial into a preallocated buffer.
+
+    Recording a flip is a single store into a NumPy array, so the recorder can
+    stay on in the frame loop; all statistics are computed after the trial.
+    A frame interval longer than budget counts as dropped frames (one per
+    refresh period missed), and the trial is flagged when more than
+    max_dropped frames were dropped.
+    """
+    def __init__(self, refresh_rate=60, capacity=4096, budget=None, max_dropped=0):
+        """Initialize the recorder.
+
+        Arguments:
+            refresh_rate -- the display refresh rate, in Hz
+            capacity -- the most flips recorded per trial; later flips are counted but not stored
+            budget -- the longest acceptable frame time, in seconds; by default 1.5 refresh periods
+            max_dropped -- the number of dropped frames a trial may have before it is flagged
+        """
+        self.period = 1.0 / refresh_rate
+        self.budget = budget if budget is not None else 1.5*self.period
+        self.max_dropped = max_dropped
+        self.stamps = np.zeros(capacity)
+        self.count = 0
+
+    def start(self):
+        """Forget the previous trial's flips."""
+        self.count = 0
+
+    def record(self, flip_time):
+        """Store the time of one flip."""
+        if self.count < len(self.stamps):
+            self.stamps[self.count] = flip_time
+        self.count += 1
+
+    def summary(self):
+        """Return the trial's frame statistics: mean, median, 95th percentile and longest frame
+        time in milliseconds, the number of dropped frames and whether the trial is flagged.
+        """
+        intervals = np.diff(self.stamps[:min(self.count, len(self.stamps))])
+        if len(intervals) == 0:
+            return dict(mean=None, median=None, p95=None, max=None, dropped=0, flagged=0)
+        late = intervals[intervals > self.budget]
+        dropped = int(np.maximum(np.rint(late / self.period) - 1, 1).sum())
+        ms = 1000*intervals
+        return dict(mean=float(ms.mean()), median=float(np.median(ms)), p95=float(np.percentile(ms, 95)),
+                    max=float(ms.max()), dropped=dropped, flagged=int(dropped > self.max_dropped))
@@ -0,0 +1,148 @@
+"""Seeded, pre-generated session trajectories cached on disk as memory-mapped arrays.
+
+A session's trajectories are a single (trials, frames, objects, 4) float32 array
+of x, y, vx and vy per display frame. It is fully determined by the seed and the
+trial parameters, which also name the cache file, so playback in Trial.run is a
+plain buffer read per frame. The collisions and wall bounces of every physics
+step are logged while the session is simulated and cached beside it (see
+load_events), so played-back trials are recorded with their exact events.
+"""
+import hashlib
+import json
+import os
+import random
+
+import numpy as np
+
+from mot.physics import Integrator, World
+from mot.recorder import COLLISION, TrajectoryRecorder
+from mot.render import NullRenderer
+from mot.trial import Trial
+
+CACHE_VERSION = 3 # bump when the simulation or the cache files change, so stale caches are not reused
+
+
+def trial_rng(seed, index):
+    """Return an independent random.Random for trial index of the session seeded with seed."""
+    state = np.random.SeedSequence(seed, spawn_key=(index,)).generate_state(2, dtype=np.uint64)
+    return random.Random(int(state[0]) << 64 | int(state[1]))
+
+
+def session_key(seed, num_trials, num_objects, object_size, trial_duration, display_size=(1200, 900),
+                frame_rate=60, physics_rate=240):
+    """Return the cache key naming a session's trajectories."""
+    params = dict(version=CACHE_VERSION, seed=seed, num_trials=num_trials, num_objects=num_objects,
+                  object_size=object_size, trial_duration=trial_duration, display_size=list(display_size),
+                  frame_rate=frame_rate, physics_rate=physics_rate)
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:20]
+
+
+def place_trials(seed, indices, num_objects, object_size, trial_duration, display_size=(1200, 900),
+                 physics_rate=240):
+    """Place the trials with the given indices of a session and gather them into one World.
+
+    Each trial is placed by a headless Trial using its own seeded stream; its
+    objects are added to the world in order, with a collision group per trial
+    and hemifield (2*k and 2*k + 1 for the k-th index) so trials cannot interact.
+    Returns the world and the list of trials.
+
+    Arguments:
+        seed -- the session seed
+        indices -- the indices of the trials in the session
+        num_objects, object_size, trial_duration -- as for Trial
+        display_size -- the width and height of the display area, in pixels
+        physics_rate -- the fixed rate of the physics simulation, in steps per second
+    """
+    world = World(len(indices)*num_objects)
+    trials = []
+    for k, index in enumerate(indices):
+        trial = Trial(NullRenderer(), None, None, None, num_objects, [None]*num_objects, object_size,
+                      ['circle']*num_objects, trial_duration, physics_rate, display_size, rng=trial_rng(seed, index))
+        trial.place()
+        tw = trial.world
+        for i in range(tw.count):
+            world.add(tw.pos[i], tw.vel[i], tw.radius[i], tw.bounds[i].reshape(2, 2), 2*k + tw.group[i])
+        trials.append(trial)
+    return world, trials
+
+
+def generate_session(filename, seed, num_trials, num_objects, object_size, trial_duration, display_size=(1200, 900),
+                     frame_rate=60, physics_rate=240, events_file=None):
+    """Simulate every trial of a session and write the trajectories to a .npy file.
+
+    All trials are placed (see place_trials) and then advanced together in one World.
+    The events of every physics step are written to events_file, if given, as an
+    .npz of trial (the trial of each event), times and events (as in mot.recorder,
+    with the trial's own disc indices), ordered by trial and then time.
+
+    Arguments:
+        filename -- the .npy file to write
+        seed -- the session seed
+        num_trials -- the number of trials in the session
+        num_objects, object_size, trial_duration -- as for Trial
+        display_size -- the width and height of the display area, in pixels
+        frame_rate -- the display rate the trajectories are sampled at
+        physics_rate -- the fixed rate of the physics simulation, in steps per second
+        events_file -- the file, or the name of the file, to write the events to
+    """
+    frames = int(np.ceil(trial_duration*frame_rate)) + 1
+    world, _ = place_trials(seed, range(num_trials), num_objects, object_size, trial_duration, display_size,
+                            physics_rate)
+
+    out = np.lib.format.open_memmap(filename, mode='w+', dtype=np.float32, shape=(num_trials, frames, num_objects, 4))
+    log = TrajectoryRecorder(None, capacity=0) # only its event log is used
+    log.start(world)
+    integrator = Integrator(world, physics_rate, recorder=log)
+    for f in range(frames):
+        integrator.advance(f / frame_rate)
+        out[:, f, :, :2] = world.pos.reshape(num_trials, num_objects, 2)
+        out[:, f, :, 2:] = world.vel.reshape(num_trials, num_objects, 2)
+    out.flush()
+    del out
+
+    if events_file is not None:
+        times, events = log.event_times[:log.event_count], log.events[:log.event_count].copy()
+        trial = events[:, 1] // num_objects
+        events[:, 1] %= num_objects
+        events[events[:, 0] == COLLISION, 2] %= num_objects
+        order = np.argsort(trial, kind='stable')
+        np.savez(events_file, trial=trial[order], times=times[order], events=events[order])
+
+
+def load_session(seed, num_trials, num_objects, object_size, trial_duration, display_size=(1200, 900),
+                 frame_rate=60, physics_rate=240, cache_dir='trajectory_cache'):
+    """Return a session's trajectories as a read-only memory map, generating them if not cached.
+
+    Arguments are as for generate_session, plus:
+        cache_dir -- the directory holding the cached trajectory files
+    """
+    key = session_key(seed, num_trials, num_objects, object_size, trial_duration, display_size,
+                      frame_rate, physics_rate)
+    filename = os.path.join(cache_dir, key + '.npy')
+    if not os.path.exists(filename):
+        os.makedirs(cache_dir, exist_ok=True)
+        partial = filename + '.%d.tmp' % os.getpid()
+        events = os.path.join(cache_dir, key + '.events.npz')
+        with open(events + '.%d.tmp' % os.getpid(), 'wb') as events_file:
+            generate_session(partial, seed, num_trials, num_objects, object_size, trial_duration, display_size,
+                             frame_rate, physics_rate, events_file)
+        os.replace(events_file.name, events) # before the trajectories, whose file marks the session as cached
+        os.replace(partial, filename)
+    return np.load(filename, mmap_mode='r')
+
+
+def load_events(seed, num_trials, num_objects, object_size, trial_duration, display_size=(1200, 900),
+                frame_rate=60, physics_rate=240, cache_dir='trajectory_cache'):
+    """Return the collisions and wall bounces of every trial of a session, generating it if not cached.
+
+    Returns a list with the (event_times, events) arrays of each trial, as
+    mot.recorder stores them. Arguments are as for load_session.
+    """
+    load_session(seed, num_trials, num_objects, object_size, trial_duration, display_size, frame_rate,
+                 physics_rate, cache_dir)
+    key = session_key(seed, num_trials, num_objects, object_size, trial_duration, display_size,
+                      frame_rate, physics_rate)
+    with np.load(os.path.join(cache_dir, key + '.events.npz')) as archive:
+        trial, times, events = archive['trial'], archive['times'], archive['events']
+    splits = np.searchsorted(trial, np.arange(1, num_trials))
+    return list(zip(np.split(times, splits), np.split(events, splits)))
@@ -0,0 +1,476 @@
+"""Trial and display-object classes for the Multiple Object Tracking task.
+
+Nothing here needs PsychoPy at import time: trials draw through a renderer
+(see mot.render), so physics, placement and scoring also run headless.
+"""
+import math
+import random
+
+import numpy as np
+
+from mot.broadphase import UniformGrid
+from mot.physics import Integrator, World
+from mot.placement import place_discs
+from mot.profiling import NullProfiler, phase
+from mot.responses import ResponseInput
+from mot.scoring import THRESHOLD, angular_error
+
+def queried_side(left_percentage, questioned):
+    """Return the side the queried object is taken from: 0 for left, 1 for right.
+
+    With 50/50 priorities, questioned is 51 for the left side and 52 for the right;
+    otherwise it is the priority of the questioned side.
+    """
+    if left_percentage == 50:
+        return 0 if questioned == 51 else 1
+    return 0 if left_percentage == questioned else 1
+
+#------ Define classes for experiment objects -------#
+
+class motObject:
+    """A class for the display objects.
+
+    The object's position, velocity and bounces live in a shared physics World,
+    the object itself is a thin view over its row of that world.
+    """
+    def __init__(self, renderer, size, pos, bounds, color, shape, world=None, group=0, velocity=None, rng=None):
+        """Initialize a display object.
+
+        Arguments:
+            renderer -- the renderer that creates the object's stimulus
+            radius -- the radius of the object
+            pos -- the starting position of the object
+            bounds -- the x coordinates of the left and right edges of the display window,
+                      and the y coordinates of the top and bottom edges of the display window
+            world -- the physics World holding every object of the trial
+            group -- the hemifield of the object (0 left, 1 right); objects only collide within it
+            velocity -- the starting velocity; by default a diagonal at the object's speed
+            rng -- the random number generator choosing the starting direction
+        """
+        self.renderer = renderer
+        self.size = size
+        self.color = color
+        self.shape = shape
+
+        self.speed = 6 # initial speed, in pixels per 60 Hz frame
+
+        rng = rng if rng is not None else random
+        if velocity is None:
+            velocity = [self.speed*rng.choice([-1,1]), self.speed*rng.choice([-1,1])]
+        self.world = world if world is not None else World()
+        self.index = self.world.add(pos, velocity, self.size, self.inner_bounds(bounds), group)
+
+    def inner_bounds(self, bounds):
+        """Return the limits of the object's centre inside the display bounds."""
+        return [(bounds[0][0] + 0.5*self.size, bounds[0][1] - 0.5*self.size),#left + right
+                (bounds[1][0] - 0.5*self.size, bounds[1][1] + 0.5*self.size)]#top + bottom
+
+    @property
+    def pos(self):
+        return self.world.pos[self.index]
+
+    @property
+    def velocity(self):
+        return self.world.vel[self.index]
+
+    @property
+    def bounds(self):
+        return self.world.bounds[self.index]
+
+    @property
+    def bounces(self):
+        return int(self.world.bounces[self.index])
+
+    @property
+    def collisions(self):
+        return int(self.world.collisions[self.index])
+
+    def create(self):
+        pass
+
+    def clear(self):
+        """Clear the object from the screen."""
+        self.obj.setAutoDraw(False)
+
+    def update(self):
+        """Move the stimulus to the object's current position in the world."""
+        self.obj.setPos((self.pos[0], self.pos[1])) #redraws on new location
+
+
+class motCircle(motObject):
+    def __init__(self, renderer, size, pos, bounds, color, shape, world=None, group=0, velocity=None, rng=None):
+        self.radius = size #*.75
+        super().__init__(renderer, size, pos, bounds, color, shape, world, group, velocity, rng)
+
+    def inner_bounds(self, bounds):
+        return [(bounds[0][0] + self.radius, bounds[0][1] - self.radius),
+                (bounds[1][0] - self.radius, bounds[1][1] + self.radius)]
+
+    def create(self):
+        """Create a circle stimulus with the correct features.
+        """
+        self.obj = self.renderer.circle(self.radius, (self.pos[0], self.pos[1]), self.color)
+        self.obj.setAutoDraw(True)
+
+class Trial:
+    """A class to run and store attributes for a single trial."""
+    def __init__(self, renderer, mouse, background_color, fixation_color, num_objects, object_colors, object_size, object_shapes,
+    trial_dur, physics_rate=240, display_size=(1200, 900), rng=None, trajectory=None, trajectory_rate=60,
+    batch_draw=False, frame_timer=None, profiler=None, responses=None, recorder=None, trajectory_events=None):
+        """Initializes a trial.
+
+        Arguments:
+            renderer -- the renderer to draw with, e.g. a PsychopyRenderer or a headless NullRenderer
+            mouse -- the active mouse to monitor for input, or None when running headless
+            num_objects -- the number of objects to draw on the trial
+            trial_dur -- the duration of the trial, in seconds
+            physics_rate -- the fixed rate of the physics simulation, in steps per second
+            display_size -- the width and height of the display area, in pixels
+            rng -- the random number generator for placement, directions and the queried
+                   object (e.g. a seeded random.Random); defaults to the random module
+            trajectory -- an optional pre-generated (frames, num_objects, 4) array of x, y,
+                          vx, vy per frame (see mot.trajectories); the trial then plays it
+                          back instead of simulating
+            trajectory_rate -- the frame rate the trajectory was sampled at
+            batch_draw -- draw all objects as one element array in a single draw call, rather
+                          than one stimulus per object
+            frame_timer -- an optional FrameTimer (see mot.timing) recording the flips of run()
+            profiler -- an optional Profiler (see mot.profiling) timing each phase of the trial
+            responses -- the ResponseInput (see mot.responses) collecting the participant's
+                         response; by default one is made for the window and mouse
+            recorder -- an optional TrajectoryRecorder (see mot.recorder) recording every
+                        frame and event of run()
+            trajectory_events -- the (event_times, events) of the trajectory, logged when it was
+                                 generated (see mot.trajectories.load_events), for the recorder
+    """
+        self.renderer = renderer
+        self.window = renderer.window
+        self.mouse = mouse
+        self.responses = responses
+        self.background_color = background_color
+        self.fixation_color = fixation_color
+        self.num_objects = num_objects
+        self.objects = []
+        self.object_colors = object_colors
+        self.object_size = object_size
+        self.object_shapes = object_shapes
+        self.trial_dur = trial_dur
+        self.physics_rate = physics_rate
+        self.rng = rng if rng is not None else random
+        self.trajectory = trajectory
+        self.trajectory_rate = trajectory_rate
+        self.trajectory_events = trajectory_events
+        self.display_size = display_size
+        width, height = display_size
+        self.bounds_left=[(-width/2, 0), (height/2, -height/2)] #left
+        self.bounds_right=[(0, width/2), (height/2, -height/2)] #right
+        # Stimuli are built in setup(), on the thread that owns the window
+        self.background = None
+        self.fixxvert = None
+        self.fixxhoriz = None
+        self.batch_draw = batch_draw
+        self.discs = None # the element array drawing every object when batch_draw is set
+        self.prepared = False
+        self.frame_timer = frame_timer
+        self.frame_stats = None
+        self.recorder = recorder
+        self.profiler = profiler if profiler is not None else NullProfiler()
+        self.bounces = 0
+        self.count = 0
+        self.to_stay = None
+        self.object_maker = {'circle': motCircle}
+        # Each pair of discs is tested once per step, left and right discs never meet.
+        # Cells are two diameters wide so discs moving within a substep stay neighbours.
+        self.world = World(num_objects, UniformGrid([self.bounds_left, self.bounds_right], 4*self.object_size))
+        self.error = None
+        self.target_state = None # x, y, vx, vy of the queried object when it was scored
+        self.response_pos = None # where the response ended
+        self.activate_reaction_time = None
+        self.response_reaction_time = None
+        self.score = None
+
+
+    def prepare(self):
+        """Do the work of setting up that needs no window: placement and trajectory loading.
+
+        Safe to call from a worker thread (see mot.scheduler); setup() calls it if nobody has.
+        """
+        if not self.prepared: # checked outside the span, so a trial records one 'prepare'
+            self._prepare()
+
+    @phase('prepare')
+    def _prepare(self):
+        if self.trajectory is not None:
+            self.trajectory = np.array(self.trajectory) # read the cached frames into memory now, not during run()
+            self.place_from_trajectory()
+        else:
+            self.place()
+        self.prepared = True
+
+    @phase('setup')
+    def setup(self):
+        #Set up the visuals for the trial and create all the objects.
+        self.prepare()
+        self.renderer.new_trial()
+        self.background = self.renderer.rect(self.display_size[0], self.display_size[1], self.background_color)
+        self.fixxvert = self.renderer.line([0, 450], [0, -450], self.fixation_color)
+        self.fixxhoriz = self.renderer.line([-18, 0], [18, 0], self.fixation_color)
+        self.background.setAutoDraw(True)
+
+        if self.batch_draw:
+            self.discs = self.renderer.disc_array(self.world.radius, self.world.pos,
+                                                  [object.color for object in self.objects])
+            self.discs.setAutoDraw(True)
+        else:
+            [object.create() for object in self.objects[::-1]] # actually draws objects based on motObject create
+
+        self.fixxvert.setAutoDraw(True)
+        self.fixxhoriz.setAutoDraw(True)
+        self.renderer.flip()
+
+    def place_from_trajectory(self):
+        """Create the objects at the first frame of the pre-generated trajectory."""
+        num_objects_half = int(self.num_objects/2)
+        for i, (x, y, vx, vy) in enumerate(self.trajectory[0]):
+            left = i < num_objects_half
+            self.objects += [self.object_maker[self.object_shapes[i]](self.renderer, self.object_size,
+            pos=[x, y], bounds=self.bounds_left if left else self.bounds_right, color=self.object_colors[i],
+            shape=self.object_shapes[i], world=self.world, group=0 if left else 1, velocity=[vx, vy])]
+
+    def place(self):
+        """Create the objects at random positions in each hemifield, more than two radii apart.
+
+        Raises PlacementError (see mot.placement) if a hemifield cannot hold its objects.
+        """
+        num_objects_half = int(self.num_objects/2) #an integer spliting the total number of objects
+        width, height = self.display_size
+        margin = 2*self.object_size # keep the objects this far from the edges and the midline
+        regions = [((-width/2 + margin, -margin), (-height/2 + margin, height/2 - margin)), #left
+                   ((margin, width/2 - margin), (-height/2 + margin, height/2 - margin))] #right
+        for group, (bounds, region) in enumerate(zip([self.bounds_left, self.bounds_right], regions)):
+            positions = place_discs(num_objects_half, region, 2*self.object_size, self.rng)
+            for i, pos in enumerate(positions):
+                self.objects += [self.object_maker[self.object_shapes[i]](self.renderer, self.object_size,
+                pos=list(pos), bounds=bounds, color=self.object_colors[i], shape=self.object_shapes[i],
+                world=self.world, group=group, rng=self.rng)]
+
+    @phase('clear')
+    def clear(self):
+        """Clear the display."""
+        self.background.setAutoDraw(False)
+        self.fixxhoriz.setAutoDraw(False)
+        self.fixxvert.setAutoDraw(False)
+
+        if self.discs is not None:
+            self.discs.setAutoDraw(False)
+        else:
+            [object.clear() for object in self.objects]
+        self.renderer.flip()
+
+
+    def check_if_click_inside_ball(self, x, y):
+        from psychopy import event
+        position_of_mouse = event.Mouse(visible = True, win = self.window)
+
+
+
+    @phase('draw_arrow')
+    def draw_arrow(self, x, y, xcirc, ycirc, unknown, line):
+        temp_x = x + self.objects[self.to_stay].velocity[0] * (unknown-2)
+        temp_y = y + self.objects[self.to_stay].velocity[1] * (unknown-2)
+
+        if (temp_x > x) and (temp_y > y): # quadrants
+            vert = [(x,y),(xcirc,ycirc), (temp_x+math.cos(135)*10, temp_y+math.sin(45)*10), (temp_x-math.cos(135)*10, temp_y-math.sin(45)*10), (xcirc,ycirc)]
+        elif (temp_x > x) and (temp_y < y):
+            vert = [(x,y),(xcirc,ycirc), (temp_x+math.cos(315)*10, temp_y+math.sin(45)*10), (temp_x-math.cos(315)*10, temp_y-math.sin(45)*10), (xcirc,ycirc)] # katw dexia je panw aristera
+        elif (temp_x < x) and (temp_y > y):
+            vert = [(x,y),(xcirc,ycirc), (temp_x+math.cos(315)*10, temp_y+math.sin(45)*10), (temp_x-math.cos(315)*10, temp_y-math.sin(45)*10), (xcirc,ycirc)]
+        else:
+            vert = [(x,y),(xcirc,ycirc), (temp_x+math.cos(135)*10, temp_y+math.sin(45)*10), (temp_x-math.cos(135)*10, temp_y-math.sin(45)*10), (xcirc,ycirc)]
+        arrow = self.renderer.shape(vert, 'green')
+        # while mouse.getPressed()[0] == False: # with first click, arrow appears
+        #     pass
+        arrow.setAutoDraw(True)
+        self.renderer.flip()
+
+        self.renderer.wait(2)
+        arrow.setAutoDraw(False)
+        line.setAutoDraw(False)
+
+    def calculate_distance(self, x1, x2, y1, y2):
+        distance = ((x1-x2)**2+(y1-y2)**2)**0.5
+        return distance
+
+
+    def find_angle(self, mouse_x, mouse_y, xcirc, ycirc):
+        """Score the angle between the response towards (mouse_x, mouse_y) and the feedback
+        point (xcirc, ycirc) ahead of the queried object (see mot.scoring).
+        """
+        target = self.objects[self.to_stay]
+        x, y = float(target.pos[0]), float(target.pos[1])
+        self.target_state = (x, y, float(target.velocity[0]), float(target.velocity[1]))
+        self.response_pos = (float(mouse_x), float(mouse_y))
+        self.error = abs(angular_error(x, y, xcirc - x, ycirc - y, mouse_x, mouse_y))
+        if (self.error <= THRESHOLD):
+            self.score = 1
+        else:
+            self.score = 0
+
+    def feedback_point(self):
+        """Return the point 50 pixels from the queried object along its direction of motion,
+        and the multiple of its velocity that reaches it.
+        """
+        end_x = self.objects[self.to_stay].pos[0]
+        end_y = self.objects[self.to_stay].pos[1]
+        next_position_x = end_x + self.objects[self.to_stay].velocity[0]
+        next_position_y = end_y + self.objects[self.to_stay].velocity[1]
+
+        dist = math.sqrt((end_x-next_position_x)**2+(end_y-next_position_y)**2)
+        unknown = 50 / dist # 8.8 RADIUS
+
+        xcirc = end_x + self.objects[self.to_stay].velocity[0] * unknown
+        ycirc = end_y + self.objects[self.to_stay].velocity[1] * unknown
+        return xcirc, ycirc, unknown
+
+    def score_response(self, mouse_x, mouse_y):
+        """Score a response pointing from the queried object towards (mouse_x, mouse_y)."""
+        xcirc, ycirc, unknown = self.feedback_point()
+        self.find_angle(mouse_x, mouse_y, xcirc, ycirc)
+
+    @phase('create_arrow')
+    def create_arrow(self, x, y, onset=None):
+        """Collect the participant's response for the object at (x, y), show feedback and score it.
+
+        Reaction times are taken on the monotonic clock of the ResponseInput; onset is
+        the flip time of the frame that showed the object alone, and defaults to now.
+        """
+        from psychopy import event
+        position_of_mouse = event.Mouse(visible = True, newPos = [x,y], win = self.window)
+        if self.responses is None:
+            self.responses = ResponseInput(self.window, self.mouse)
+        x = x*2
+        y = y*2
+
+        # while mouse.getPressed()[0] == False: # with first click, arrow appears
+        #     pass
+
+        t0 = onset if onset is not None else self.responses.now()
+        pos_mouse, t1 = self.responses.wait_click( # first response, a click on the ball
+            lambda pos: ((pos[0] - x/2)**2 + (pos[1] - y/2)**2)**0.5 <= 50)
+        ## Apparance of a moving arrow ###
+        reaction_time_1 = t1 - t0
+        self.activate_reaction_time = reaction_time_1
+
+        #print(event.getKeys(keyList = 'space'))
+        vert = [(x, y), (pos_mouse[0]*2, pos_mouse[1]*2)]
+        line = self.renderer.shape(vert, 'white', line_width=3)
+        line.setAutoDraw(True)
+
+        self.responses.clear()
+        pressed = []
+        while not pressed: # with second click, feedback appears; the flip paces the loop
+            pos_mouse = self.mouse.getPos()
+            line.setVertices([(x, y), (pos_mouse[0]*2, pos_mouse[1]*2)]) # the same line follows the mouse
+            self.renderer.flip()
+            pressed = self.responses.get_keys(['space'])
+        t2 = pressed[0][1]
+        reaction_time_2 = t2 - t1
+        self.response_reaction_time = reaction_time_2
+
+        ### End of the moving arrow ###
+
+        ### SHOW FEEDBACK ###
+        xcirc, ycirc, unknown = self.feedback_point()
+
+        self.draw_arrow(x, y, xcirc*2, ycirc*2, unknown, line)
+        ### END SHOWING FEEDBACK ###
+
+        self.find_angle(pos_mouse[0], pos_mouse[1], xcirc, ycirc)
+
+    def remove_smart(self, left, right): # if keep in left side, give 0, len(self.objects)/2. If keep in right side, give len(self.objects)/2, len(self.objects)
+        self.keep_only(self.rng.randrange(left, right)) #creates a number between left and right (without right included) (i.e. stays left 0-3 (0,1,2) stays right 3-6 (3,4,5))
+
+    def keep_only(self, index):
+        """Make object index the queried object and clear the rest."""
+        self.to_stay = index
+        if self.discs is not None: # hide the rest through the element opacities
+            opacities = np.zeros(len(self.objects))
+            opacities[self.to_stay] = 1
+            self.discs.opacities = opacities
+            return
+        for i, object in enumerate(self.objects):
+            if (i != self.to_stay):
+                object.clear()
+
+
+    def select_target(self, left_percentage, questioned):
+        """Choose the queried object from the questioned side, clear the rest and return it."""
+        # Assume first len/2 objects are left and rest are right
+        if queried_side(left_percentage, questioned) == 0:
+            self.remove_smart(0, len(self.objects)//2) #stays on left
+        else:
+            self.remove_smart(len(self.objects)//2, len(self.objects)) #stays on right
+        return self.objects[self.to_stay]
+
+    @phase('clear_except_one')
+    def clear_except_one(self, left_percentage, questioned):
+        last_ball = self.select_target(left_percentage, questioned)
+        #print(last_ball.pos[0])
+        #print(last_ball.pos[1])
+        onset = self.renderer.flip()
+        self.create_arrow(last_ball.pos[0], last_ball.pos[1], onset)
+
+
+    @phase('run')
+    def run(self):
+        """Start the animation for the trial."""
+        self.timer = self.renderer.clock()
+        # catch up at most 0.1 s of motion per frame, so a stall does not cascade into more dropped frames
+        integrator = Integrator(self.world, self.physics_rate, recorder=self.recorder,
+                                max_steps=max(1, self.physics_rate//10))
+        if self.frame_timer is not None:
+            self.frame_timer.start()
+        if self.recorder is not None:
+            self.recorder.start(self.world, live=self.trajectory is None, events=self.trajectory_events)
+        elapsed = self.timer.getTime()
+        while elapsed < self.trial_dur:
+            if self.trajectory is not None:
+                self.play(elapsed)
+            else:
+                integrator.advance(elapsed) # fixed substeps up to the current time, whatever the refresh rate
+            if self.recorder is not None:
+                self.recorder.record(elapsed)
+            if self.discs is not None:
+                self.discs.xys = self.world.pos # every position in one bulk update
+            else:
+                [object.update() for object in self.objects]
+            flip_time = self.renderer.flip()
+            if self.frame_timer is not None:
+                self.frame_timer.record(flip_time)
+            elapsed = self.timer.getTime()
+        if self.frame_timer is not None:
+            self.frame_stats = self.frame_timer.summary()
+
+    def play(self, elapsed):
+        """Load the pre-generated state for the elapsed time into the world.
+
+        The nearest frame is taken, so with trajectories sampled at the refresh rate the
+        jitter of flip times never repeats or skips a frame.
+        """
+        frame = min(int(round(elapsed*self.trajectory_rate)), len(self.trajectory) - 1)
+        state = self.trajectory[frame]
+        self.world.pos[:] = state[:, :2]
+        self.world.vel[:] = state[:, 2:]
+
+    def get_data(self):
+        """Assemble the data for this trial and return it.
+
+        Returns a list of the attended color, the number of objects, the color of the
+        attended set, the color of the ignored set, the number of times the attended objects bounced,
+        the subject's reported count, and, if it was an inattentional blindness trial, the shape of the
+        ib object, the color of the ib object, whether the subject reported seeing it, what color they
+        reported it being, and what shape they reported it being.
+        """
+        #if self.is_ib:
+            #self.bounces = sum([object.bounces for object in self.objects[:-1] if object.color == self.attended_color])
+        #self.bounces = sum([object.bounces for object in self.objects if object.color == self.attended_color])